@@ -0,0 +1,167 @@
+import collections
+import copy
+import hashlib
+import logging
+import os
+import threading
+
+from pyls_mypy import project, stats
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 128
+
+# Older mypy releases only know a single config file name
+_DEFAULT_CONFIG_FILES = ['mypy.ini', '.mypy.ini', 'setup.cfg',
+                         '~/.config/mypy/config', '~/.mypy.ini']
+
+
+def config_files():
+    from mypy import defaults
+    return getattr(defaults, 'CONFIG_FILES', _DEFAULT_CONFIG_FILES)
+
+
+def config_stamps(directory):
+    '''
+    Return the (path, mtime, size) of every mypy config file that mypy would
+    consider when run from directory.
+    '''
+    stamps = []
+    for name in config_files():
+        path = os.path.join(directory, os.path.expanduser(name))
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        stamps.append((path, st.st_mtime_ns, st.st_size))
+    return stamps
+
+
+def cache_key(backend, args, document, config_dir, others=()):
+    '''
+    Return a key identifying a check of document: the mypy backend and
+    arguments, the document's path and text, the state of the mypy config
+    files and of the workspace modules the document imports, and the (path,
+    source) of the other documents checked unsaved.
+    '''
+    dependencies = project.dependency_stamps(document.path, document.source,
+                                             [config_dir])
+    digest = hashlib.sha1()
+    for part in (backend, args, document.path, config_stamps(config_dir),
+                 dependencies):
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(document.source.encode('utf-8'))
+    for path, source in others:
+        digest.update(b'\0' + path.encode('utf-8') + b'\0')
+        digest.update(hashlib.sha1(source.encode('utf-8')).digest())
+    return digest.hexdigest()
+
+
+class DiagnosticsCache(object):
+    '''
+    A bounded LRU mapping of cache keys to the diagnostics of a check.
+    '''
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            diagnostics = self._entries.get(key)
+            if diagnostics is None:
+                self.misses += 1
+                stats.registry.incr('cache_misses')
+                return None
+            self.hits += 1
+            stats.registry.incr('cache_hits')
+            self._entries.move_to_end(key)
+        log.debug("diagnostics cache hit (%d hits, %d misses)",
+                  self.hits, self.misses)
+        return copy.deepcopy(diagnostics)
+
+    def put(self, key, diagnostics):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = copy.deepcopy(diagnostics)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+diagnostics_cache = DiagnosticsCache()
+
+
+class _Call(object):
+
+    def __init__(self, cancel):
+        self.cancel = cancel
+        self.done = threading.Event()
+        self.ok = False
+        self.result = None
+
+
+class SingleFlight(object):
+    '''
+    Lets concurrent runs with the same cache key share the first one.
+
+    A run that finds another with its key in flight waits for it and takes
+    its result, unless that run failed or was cancelled, in which case it
+    runs by itself.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, run, cancel=None, ok=None):
+        '''
+        Return the result of run(), or of the run in flight for key.
+        cancel is the event that cancels run, if any, and ok(result) tells
+        whether a result can be shared, when given.
+        '''
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call(cancel)
+                    break
+            call.done.wait()
+            if call.ok and not (call.cancel and call.cancel.is_set()):
+                stats.registry.incr('single_flight_shared')
+                log.debug("shared the result of a check in flight")
+                return call.result
+
+        try:
+            call.result = run()
+            call.ok = ok is None or ok(call.result)
+            return call.result
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def __len__(self):
+        return len(self._calls)
+
+
+single_flight = SingleFlight()
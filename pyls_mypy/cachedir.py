@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SLOTS = 4
+# Where the cache directories of a workspace live, relative to its root
+CACHE_ROOT = os.path.join('.mypy_cache', 'branches')
+# Touched whenever a cache directory is used, to find the least recent one
+STAMP = 'last-used'
+
+_lock = threading.Lock()
+_git_dirs = {}
+_current = {}
+
+
+def user_cache_dir():
+    '''
+    Return the directory pyls_mypy keeps its caches in outside of workspaces.
+    '''
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pyls_mypy')
+
+
+def _find_git_dir(root):
+    path = os.path.abspath(root)
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            # Worktrees and submodules point at their git directory
+            try:
+                with open(dot_git) as f:
+                    content = f.read().strip()
+            except (IOError, OSError):
+                return None
+            if content.startswith('gitdir:'):
+                return os.path.normpath(os.path.join(
+                    path, content[len('gitdir:'):].strip()))
+            return None
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def git_head(root):
+    '''
+    Return what HEAD of the git checkout containing root is: the ref of the
+    branch checked out, or the commit when detached; or None outside of git.
+    '''
+    with _lock:
+        if root not in _git_dirs:
+            _git_dirs[root] = _find_git_dir(root)
+        git_dir = _git_dirs[root]
+    if git_dir is None:
+        return None
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+    except (IOError, OSError):
+        return None
+    if head.startswith('ref:'):
+        return head[len('ref:'):].strip()
+    return head or None
+
+
+def slot_name(head):
+    '''
+    Return the directory name of the cache of a git HEAD.
+    '''
+    name = head[len('refs/heads/'):] if head.startswith('refs/heads/') \
+        else head
+    name = re.sub(r'[^\w.-]+', '_', name)[:40]
+    return '%s-%s' % (name, hashlib.sha1(head.encode('utf-8')).hexdigest()[:8])
+
+
+def _slots(base):
+    slots = []
+    try:
+        names = os.listdir(base)
+    except OSError:
+        return slots
+    for name in names:
+        try:
+            used = os.stat(os.path.join(base, name, STAMP)).st_mtime
+        except OSError:
+            used = 0
+        slots.append((used, name))
+    return sorted(slots)
+
+
+def _touch(path):
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+def evict(base, keep):
+    '''
+    Remove the least recently used cache directories under base, keeping
+    the keep most recent ones; return the names of those removed.
+    '''
+    slots = _slots(base)
+    removed = []
+    for _, name in slots[:max(len(slots) - keep, 0)]:
+        log.info("removing mypy cache %s", os.path.join(base, name))
+        shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+        removed.append(name)
+    return removed
+
+
+def slot_dirs(root):
+    '''
+    Return the cache directories kept for the workspace at root.
+    '''
+    base = os.path.join(root, CACHE_ROOT)
+    return [os.path.join(base, name) for _, name in _slots(base)]
+
+
+def current_slot(root):
+    '''
+    Return the cache directory of the git HEAD the workspace at root has
+    checked out, whether or not it exists, or None outside of git.
+    '''
+    head = git_head(root)
+    if head is None:
+        return None
+    return os.path.join(root, CACHE_ROOT, slot_name(head))
+
+
+def cache_dir(root, slots=DEFAULT_SLOTS):
+    '''
+    Return the mypy cache directory for the workspace at root and the git
+    HEAD it has checked out, or None when root is not in a git checkout.
+
+    Every HEAD gets its own directory, so that switching branches finds the
+    cache of the branch warm; only the slots most recently used are kept.
+    '''
+    path = current_slot(root)
+    if path is None:
+        return None
+    base = os.path.dirname(path)
+    with _lock:
+        if _current.get(root) == path:
+            return path
+        _current[root] = path
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        _touch(os.path.join(path, STAMP))
+        evict(base, slots)
+    except OSError:
+        log.exception("cannot set up mypy cache %s", path)
+        return None
+    return path
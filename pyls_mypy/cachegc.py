@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from pyls_mypy import sqlitecache, stats, warmup
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 3600
+DEFAULT_MAX_AGE_DAYS = 30
+# How long no check must have run in the foreground before collecting
+DEFAULT_IDLE = 5.0
+
+META_SUFFIX = '.meta.json'
+ENTRY_SUFFIXES = (META_SUFFIX, '.data.json', '.deps.json')
+
+_collectors = {}
+_collectors_lock = threading.Lock()
+
+
+def _is_garbage(meta, used, base, max_age, now, checked_out):
+    # Entries of mypy itself, e.g. @deps.meta.json, have no source
+    source = meta.get('path') if isinstance(meta, dict) else None
+    if not source:
+        return False
+    if checked_out and not os.path.exists(os.path.join(base, source)):
+        return True
+    return bool(max_age) and used is not None and now - used > max_age
+
+
+def _version_dirs(cache_dir):
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return []
+    # mypy keeps a directory per Python version, e.g. 3.8
+    return [os.path.join(cache_dir, name) for name in sorted(names)
+            if re.match(r'^\d+\.\d+$', name) and
+            os.path.isdir(os.path.join(cache_dir, name))]
+
+
+def _collect_files(version_dir, base, max_age, interrupted, checked_out):
+    removed = reclaimed = 0
+    now = time.time()
+    for directory, _, filenames in os.walk(version_dir):
+        for filename in filenames:
+            if not filename.endswith(META_SUFFIX):
+                continue
+            if interrupted():
+                return removed, reclaimed
+            stem = os.path.join(directory, filename[:-len(META_SUFFIX)])
+            try:
+                st = os.stat(stem + META_SUFFIX)
+                with open(stem + META_SUFFIX) as f:
+                    meta = json.load(f)
+            except (IOError, OSError, ValueError):
+                continue
+            # Reading an entry only shows in its access time
+            if not _is_garbage(meta, max(st.st_atime, st.st_mtime), base,
+                               max_age, now, checked_out):
+                continue
+            for suffix in ENTRY_SUFFIXES:
+                try:
+                    size = os.path.getsize(stem + suffix)
+                    os.remove(stem + suffix)
+                except OSError:
+                    continue
+                reclaimed += size
+            removed += 1
+    return removed, reclaimed
+
+
+def _collect_database(path, base, interrupted, checked_out):
+    # Rows only record when they were written, so they do not age
+    removed = 0
+    if not checked_out:
+        return removed
+    conn = sqlite3.connect(path, timeout=0)
+    try:
+        rows = conn.execute('SELECT path, data FROM files WHERE path LIKE ?',
+                            ('%' + META_SUFFIX,)).fetchall()
+        for name, data in rows:
+            if interrupted():
+                break
+            try:
+                meta = json.loads(data)
+            except ValueError:
+                continue
+            if not _is_garbage(meta, None, base, 0, 0, True):
+                continue
+            stem = name[:-len(META_SUFFIX)]
+            conn.executemany('DELETE FROM files WHERE path = ?',
+                             [(stem + suffix,) for suffix in ENTRY_SUFFIXES])
+            removed += 1
+        conn.commit()
+    finally:
+        conn.close()
+    return removed
+
+
+def collect(cache_dir, base, max_age_days=DEFAULT_MAX_AGE_DAYS,
+            interrupted=lambda: False, checked_out=True):
+    '''
+    Remove the entries of the mypy cache at cache_dir for modules whose
+    source file is gone, or that were not used for max_age_days (0 never
+    ages them out). Relative source paths are relative to base, where mypy
+    ran. Sources are only looked for when checked_out tells that base has
+    the sources the cache was built from, e.g. not for the cache of another
+    git branch. Stops early once interrupted() is true.
+
+    Return the number of entries removed and of bytes reclaimed.
+    '''
+    max_age = max_age_days * 24 * 3600
+    removed = reclaimed = 0
+    for version_dir in _version_dirs(cache_dir):
+        database = os.path.join(version_dir, sqlitecache.DB_NAME)
+        if os.path.isfile(database):
+            try:
+                removed += _collect_database(database, base, interrupted,
+                                             checked_out)
+            except sqlite3.Error as e:
+                log.warning("cannot collect mypy cache %s: %s", database, e)
+        entries, size = _collect_files(version_dir, base, max_age,
+                                       interrupted, checked_out)
+        removed += entries
+        reclaimed += size
+    if sqlitecache.databases(cache_dir) and not interrupted():
+        reclaimed += sqlitecache.vacuum(cache_dir)
+
+    stats.registry.incr('gc_removed', removed)
+    stats.registry.incr('gc_reclaimed_bytes', reclaimed)
+    if removed:
+        log.info("removed %d entries from mypy cache %s, reclaiming %d bytes",
+                 removed, cache_dir, reclaimed)
+    return removed, reclaimed
+
+
+class Collector(object):
+    '''
+    Collects the mypy caches of a workspace every interval seconds, in idle
+    time: it waits for no check to have run in the foreground for a while,
+    and stops as soon as one starts.
+
+    cache_dirs() returns the cache directories to collect, each with whether
+    the workspace has the sources it was built from checked out.
+    '''
+
+    def __init__(self, cache_dirs, base, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                 interval=DEFAULT_INTERVAL, idle=DEFAULT_IDLE):
+        self.cache_dirs = cache_dirs
+        self.base = base
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.idle = idle
+        self._stop = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=self._loop, name='pyls_mypy-gc')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run()
+
+    def _interrupted(self):
+        return self._stop.is_set() or warmup.idle_time() < self.idle
+
+    def run(self):
+        '''
+        Wait for idle time and collect; return the bytes reclaimed.
+        '''
+        while warmup.idle_time() < self.idle:
+            if self._stop.wait(self.idle):
+                return 0
+        reclaimed = 0
+        for cache_dir, checked_out in self.cache_dirs():
+            if self._interrupted():
+                log.debug("mypy cache collection interrupted")
+                break
+            reclaimed += collect(cache_dir, self.base, self.max_age_days,
+                                 self._interrupted, checked_out)[1]
+        return reclaimed
+
+    def stop(self):
+        self._stop.set()
+
+
+def start(root, collector):
+    '''
+    Start collector for the workspace at root, stopping the previous one.
+    '''
+    with _collectors_lock:
+        previous = _collectors.get(root)
+        if previous is not None:
+            previous.stop()
+        _collectors[root] = collector.start()
+    return collector
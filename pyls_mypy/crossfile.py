@@ -0,0 +1,33 @@
+import threading
+
+_lock = threading.Lock()
+# Workspace root -> paths of files that have diagnostics published for them
+# by checks of other files
+_published = {}
+
+
+def published(root):
+    '''
+    Return the paths under root that were last published with diagnostics
+    coming from checks of other files.
+    '''
+    with _lock:
+        return set(_published.get(root, ()))
+
+
+def update(root, path, diagnostics):
+    '''
+    Record the diagnostics last published for path by a check of another
+    file.
+    '''
+    with _lock:
+        paths = _published.setdefault(root, set())
+        if diagnostics:
+            paths.add(path)
+        else:
+            paths.discard(path)
+
+
+def reset():
+    with _lock:
+        _published.clear()
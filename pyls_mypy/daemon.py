@@ -0,0 +1,187 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from pyls_mypy import report, supervisor, watcher
+
+log = logging.getLogger(__name__)
+
+# dmypy exits with this status when it cannot talk to the daemon at all, but
+# so does mypy on blocking errors such as a syntax error
+DAEMON_FAILURE = 2
+
+_daemons = {}
+_daemons_lock = threading.Lock()
+
+
+class Daemon(object):
+    '''
+    A mypy daemon (dmypy) started and owned by this pyls process for a single
+    workspace root. The daemon keeps the whole type graph in memory, so that
+    checks after the first one only redo the work for what changed.
+
+    Once the daemon ran too many checks or grew too large, it is restarted and
+    rechecks the files it last checked in the background.
+    '''
+
+    def __init__(self, root, flags):
+        self.root = root
+        self.flags = list(flags)
+        # Per pyls process: another one on the same root has its own daemon
+        digest = hashlib.sha1(
+            ('%s\0%d' % (root, os.getpid())).encode('utf-8')).hexdigest()[:12]
+        self.status_file = os.path.join(tempfile.gettempdir(), 'pyls_mypy',
+                                        digest, 'dmypy.json')
+        self._running = False
+        self._files = None
+        self._lock = threading.Lock()
+        self.supervisor = supervisor.Supervisor('dmypy for %s' % root)
+        # Tells which files changed since the last check, when set
+        self.watcher = None
+
+    def _dmypy(self, *args):
+        cmd = [sys.executable, '-m', 'mypy.dmypy',
+               '--status-file', self.status_file] + list(args)
+        log.debug("running %s in %s", cmd, self.root)
+        proc = subprocess.Popen(cmd, cwd=self.root,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        out, err = proc.communicate()
+        return out, err, proc.returncode
+
+    def start(self):
+        '''
+        (Re)start the daemon with the current flags.
+        '''
+        status_dir = os.path.dirname(self.status_file)
+        if not os.path.isdir(status_dir):
+            os.makedirs(status_dir)
+        out, err, status = self._dmypy('restart', '--', *self.flags)
+        if status:
+            log.error("failed to start dmypy for %s: %s", self.root,
+                      err or out)
+        self._running = not status
+        self._files = None
+        return self._running
+
+    def warm(self):
+        '''
+        Start the daemon ahead of the first check.
+        '''
+        with self._lock:
+            if not self._running:
+                self.start()
+
+    def set_flags(self, flags):
+        with self._lock:
+            if self.flags != list(flags):
+                self.flags = list(flags)
+                self.stop()
+
+    def pid(self):
+        '''
+        Return the process id of the running daemon, if known.
+        '''
+        try:
+            with open(self.status_file) as f:
+                return json.load(f)['pid']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def stop(self):
+        self.supervisor.reset()
+        if self._running:
+            self._dmypy('stop')
+        self._running = False
+        self._files = None
+
+    def check(self, files, rewarm=False):
+        '''
+        Check the given files, returning the same (report, errors, status)
+        triple as mypy.api.run. rewarm tells the check that warms a new
+        daemon after a recycle.
+
+        A repeated check of the same files is done as a recheck, which lets
+        the daemon skip rebuilding its list of sources.
+        '''
+        files = list(files)
+        with self._lock:
+            if not self._running and not self.start():
+                return '', 'dmypy could not be started', DAEMON_FAILURE
+            result = self._check(files)
+            if _failed(result):
+                # The daemon may have died or timed out underneath us
+                log.warning("dmypy failed (%s), restarting it", result[1])
+                if not self.start():
+                    return result
+                result = self._check(files)
+            if self.supervisor.checked(self.pid(), rewarm):
+                self._recycle()
+            return result
+
+    def _recycle(self):
+        files = self._files
+        self.stop()
+        if files:
+            thread = threading.Thread(target=self.check, args=(files, True),
+                                      name='pyls_mypy-rewarm')
+            thread.daemon = True
+            thread.start()
+
+    def _check(self, files):
+        if files == self._files:
+            lists = watcher.plan_recheck(self.watcher, self.flags, files,
+                                         files)
+            args = ['recheck']
+            if lists is not None:
+                update, remove = lists
+                args.extend((['--update'] + update if update else []) +
+                            (['--remove'] + remove if remove else []))
+            result = self._dmypy(*args)
+        else:
+            if self.watcher is not None:
+                # The daemon stats every file it checks anew
+                self.watcher.changes()
+            result = self._dmypy('check', *files)
+        # After blocking errors the daemon only takes a full check again
+        self._files = files if result[2] != DAEMON_FAILURE else None
+        return result
+
+
+def _failed(result):
+    '''
+    Return whether a dmypy result tells that the client could not get a
+    report from the daemon, rather than a report of blocking errors.
+    '''
+    out, err, status = result
+    return status == DAEMON_FAILURE and (
+        bool(err) or not report.parse_report(out))
+
+
+def get_daemon(root, flags):
+    '''
+    Return the daemon for a workspace root, restarting it when the flags it
+    should be running with have changed.
+    '''
+    with _daemons_lock:
+        daemon = _daemons.get(root)
+        if daemon is None:
+            daemon = _daemons[root] = Daemon(root, flags)
+        else:
+            daemon.set_flags(flags)
+        return daemon
+
+
+@atexit.register
+def stop_all():
+    with _daemons_lock:
+        for daemon in _daemons.values():
+            daemon.stop()
+        _daemons.clear()
@@ -0,0 +1,158 @@
+import gc
+import inspect
+import io
+import logging
+import os
+import threading
+from contextlib import redirect_stderr, redirect_stdout
+
+from pyls_mypy import supervisor, watcher
+
+log = logging.getLogger(__name__)
+
+# Same meaning as for dmypy: the check could not be run at all
+ENGINE_FAILURE = 2
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def preload():
+    '''
+    Import the mypy server ahead of the first check.
+    '''
+    # pylint: disable=unused-import
+    from mypy import dmypy_server  # noqa: F401
+
+
+def _check_kwargs(method):
+    # Server.cmd_check grew extra arguments over mypy releases; only pass the
+    # ones that the installed version knows about.
+    params = inspect.signature(method).parameters
+    kwargs = {'is_tty': False, 'terminal_width': 80}
+    if 'export_types' in params:
+        kwargs['export_types'] = False
+    return kwargs
+
+
+class Engine(object):
+    '''
+    A mypy fine-grained update server kept resident in the pyls process.
+
+    This is the same server object that dmypy runs in its own process, but
+    driven directly, so that ASTs and symbol tables are reused across checks
+    without any IPC. Every file ever checked stays part of the build, so that
+    checking another file does not throw away what is known about the
+    previous ones.
+
+    Once the engine ran too many checks or the pyls process grew too large,
+    the server is dropped and a new one checks the same files again in the
+    background.
+    '''
+
+    def __init__(self, root, flags):
+        self.root = root
+        self.flags = list(flags)
+        self._server = None
+        self._files = []
+        # The files of the last check, which a recheck checks again
+        self._checked = None
+        self._lock = threading.Lock()
+        self.supervisor = supervisor.Supervisor(
+            'fine-grained engine for %s' % root)
+        # Tells which files changed since the last check, when set
+        self.watcher = None
+
+    def _start(self):
+        from mypy import dmypy_server
+        options = dmypy_server.process_start_options(self.flags, False)
+        self._server = dmypy_server.Server(options, os.devnull)
+
+    def set_flags(self, flags):
+        with self._lock:
+            if self.flags != list(flags):
+                self.flags = list(flags)
+                self.stop()
+
+    def stop(self):
+        self.supervisor.reset()
+        self._server = None
+        self._files = []
+        self._checked = None
+
+    def _recycle(self):
+        files = self._files
+        self.stop()
+        # Give what the old server held back before building a new one
+        gc.collect()
+        if not files:
+            self.supervisor.rebase(os.getpid())
+            return
+        thread = threading.Thread(target=self.check, args=(files, True),
+                                  name='pyls_mypy-rewarm')
+        thread.daemon = True
+        thread.start()
+
+    def _check(self, files):
+        if self._checked != self._files:
+            if self.watcher is not None:
+                # The server stats every file it checks anew
+                self.watcher.changes()
+            return self._server.cmd_check(
+                self._files, **_check_kwargs(self._server.cmd_check))
+        lists = watcher.plan_recheck(self.watcher, self.flags, files,
+                                     self._files)
+        kwargs = _check_kwargs(self._server.cmd_recheck)
+        if lists is not None:
+            kwargs['update'], kwargs['remove'] = lists
+        return self._server.cmd_recheck(**kwargs)
+
+    def check(self, files, rewarm=False):
+        '''
+        Check the given files, returning the same (report, errors, status)
+        triple as mypy.api.run. rewarm tells the check that builds the
+        server again after a recycle.
+        '''
+        with self._lock:
+            for path in files:
+                if path not in self._files:
+                    self._files.append(path)
+            self._files = [path for path in self._files
+                           if os.path.isfile(path)]
+
+            # mypy reports some problems on stdout, which pyls talks over
+            stdout, stderr = io.StringIO(), io.StringIO()
+            try:
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    if self._server is None:
+                        self._start()
+                    res = self._check(files)
+            except SystemExit:
+                # Raised by mypy for invalid flags
+                self.stop()
+                return stdout.getvalue(), stderr.getvalue(), ENGINE_FAILURE
+            except Exception:  # pylint: disable=broad-except
+                log.exception("mypy fine-grained engine crashed, resetting it")
+                self.stop()
+                return '', stderr.getvalue(), ENGINE_FAILURE
+
+            result = (res.get('out', ''), res.get('err', ''),
+                      res.get('status', ENGINE_FAILURE))
+            self._checked = list(self._files) if 'error' not in res else None
+            if self.supervisor.checked(os.getpid(), rewarm):
+                self._recycle()
+            return result
+
+
+def get_engine(root, flags):
+    '''
+    Return the engine for a workspace root, resetting it when the flags it
+    should be running with have changed.
+    '''
+    with _engines_lock:
+        engine = _engines.get(root)
+        if engine is None:
+            engine = _engines[root] = Engine(root, flags)
+        else:
+            engine.set_flags(flags)
+        return engine
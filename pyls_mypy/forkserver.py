@@ -0,0 +1,102 @@
+import logging
+import multiprocessing
+import threading
+import timeit
+from multiprocessing import connection
+
+from pyls_mypy import report, stats
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60
+# How often a waiting check looks whether it was cancelled, in seconds
+CANCEL_POLL_INTERVAL = 0.05
+# Same meaning as mypy's exit status 2: no result could be produced
+FAILURE = 2
+
+# Imported once in the fork server, so that every child starts with them
+PRELOAD = ['pyls_mypy.report', 'mypy.build', 'mypy.main']
+
+_forkserver = None
+_forkserver_lock = threading.Lock()
+
+
+def available():
+    return 'forkserver' in multiprocessing.get_all_start_methods()
+
+
+def _child(conn, args):
+    try:
+        conn.send(report.run(args))
+    finally:
+        conn.close()
+
+
+class ForkServer(object):
+    '''
+    Runs every check in a child forked from a server process that has mypy
+    imported already.
+
+    Unlike running mypy in the pyls process, nothing mypy allocates survives
+    a check, and a check can be stopped at any time by killing its child.
+    '''
+
+    def __init__(self):
+        self._context = multiprocessing.get_context('forkserver')
+        self._context.set_forkserver_preload(PRELOAD)
+
+    def run(self, args, timeout=DEFAULT_TIMEOUT, cancel=None):
+        '''
+        Run mypy with args in a new child, returning the same result as
+        report.run. The child is killed when it takes longer than timeout
+        seconds, unless timeout is None, or when the cancel event is set.
+        '''
+        receiver, sender = self._context.Pipe(duplex=False)
+        child = self._context.Process(target=_child, args=(sender, args),
+                                      name='pyls_mypy-check')
+        child.daemon = True
+        child.start()
+        sender.close()
+
+        deadline = timeit.default_timer() + timeout \
+            if timeout is not None else None
+        try:
+            while True:
+                ready = connection.wait([receiver, child.sentinel],
+                                        CANCEL_POLL_INTERVAL)
+                if receiver in ready:
+                    return receiver.recv()
+                if child.sentinel in ready:
+                    log.error("mypy check exited with %s", child.exitcode)
+                    return [], 'mypy check exited', FAILURE
+                if cancel is not None and cancel.is_set():
+                    stats.registry.incr('forkserver_cancelled')
+                    return [], 'mypy check cancelled', FAILURE
+                if deadline is not None and \
+                        timeit.default_timer() > deadline:
+                    log.warning("mypy check timed out after %ss", timeout)
+                    stats.registry.incr('forkserver_timeouts')
+                    return [], 'mypy check timed out', FAILURE
+        except EOFError:
+            return [], 'mypy check exited', FAILURE
+        finally:
+            receiver.close()
+            if child.is_alive():
+                child.kill()
+            child.join()
+
+    def warm(self):
+        '''
+        Start the fork server ahead of the first check.
+        '''
+        child = self._context.Process(target=report.preload)
+        child.start()
+        child.join()
+
+
+def get_forkserver():
+    global _forkserver  # pylint: disable=global-statement
+    with _forkserver_lock:
+        if _forkserver is None:
+            _forkserver = ForkServer()
+        return _forkserver
@@ -0,0 +1,30 @@
+import re
+
+# The same word boundaries as pyls' Document.word_at_position; these are
+# only used with match/search at a position, which anchors them already.
+RE_START_WORD = re.compile('[A-Za-z_0-9]*$')
+RE_END_WORD = re.compile('[A-Za-z_0-9]*')
+
+
+class LineIndex(object):
+    '''
+    The lines of a document's text, split once so that any number of
+    positions can be resolved against it.
+
+    pyls' Document splits its whole source again on every word_at_position
+    call, which makes converting a large report quadratic.
+    '''
+
+    def __init__(self, source):
+        self.lines = source.splitlines(True)
+
+    def word_at_position(self, position):
+        '''
+        Return the word under position, like Document.word_at_position.
+        '''
+        if position['line'] >= len(self.lines):
+            return ''
+        line = self.lines[position['line']]
+        i = position['character']
+        return (RE_START_WORD.search(line, 0, i).group() +
+                RE_END_WORD.match(line, i).group())
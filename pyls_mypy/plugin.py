@@ -1,83 +1,822 @@
-import re
+import collections
+import contextlib
+import copy
+import functools
+import os
 import logging
-from mypy import api as mypy_api
-from pyls import hookimpl
+import threading
+from pyls import hookimpl, uris
+from pyls_mypy import (cache, cachedir, cachegc, crossfile, daemon, engine,
+                       forkserver, lines, project, report, shadow,
+                       sharedcache, sqlitecache, stale, stats, store,
+                       supervisor, warmup, watcher, worker)
 
-line_pattern = r"([^:]+):(?:(\d+):)?(?:(\d+):)? (\w+): (.*)"
+line_pattern = report.line_pattern
 
 log = logging.getLogger(__name__)
 
 
+def _is_for_document(error, document, base_dir=None):
+    if error.path == "<string>":  # live mode
+        return True
+    if not document or not document.path:
+        return True
+    if base_dir is None:
+        # Without knowing where mypy ran, only the end of the path can match
+        return document.path.endswith(error.path)
+    return os.path.normpath(os.path.join(base_dir, error.path)) == \
+        os.path.normpath(document.path)
+
+
+def error_to_diagnostic(error, document=None, line_index=None,
+                        base_dir=None):
+    '''
+    Return a language-server diagnostic for a MypyError; optionally, use the
+    whole document to provide more context on it, looking words up in
+    line_index when given. Relative error paths are relative to base_dir,
+    where mypy ran, when given.
+    '''
+    if not _is_for_document(error, document, base_dir):
+        # results from other files can be included, but they are not
+        # diagnostics for this document.
+        log.debug("discarding result for %s against %s", error.path,
+                  document.path)
+        return None
+
+    lineno = (error.line or 1) - 1  # 0-based line number
+    offset = (error.column or 1) - 1  # 0-based offset
+    errno = 2
+    if error.severity == 'error':
+        errno = 1
+    diag = {
+        'source': 'mypy',
+        'range': {
+            'start': {'line': lineno, 'character': offset},
+            'end': {'line': lineno, 'character': offset + 1}
+        },
+        'message': error.message,
+        'severity': errno
+    }
+    if error.code:
+        diag['code'] = error.code
+
+    end = ((error.end_line or error.line or 1) - 1, error.end_column or 0)
+    if end > (lineno, offset + 1):
+        # mypy's inclusive 1-based end column is the exclusive 0-based one
+        diag['range']['end'] = {'line': end[0], 'character': end[1]}
+    elif document:
+        # when mypy does not provide the end of the affected range, we can
+        # make a good guess by highlighting the word that Mypy flagged
+        word = (line_index or document).word_at_position(
+            diag['range']['start'])
+        if word:
+            diag['range']['end']['character'] = (
+                diag['range']['start']['character'] + len(word))
+
+    return diag
+
+
+def errors_to_diagnostics(errors, document, base_dir=None):
+    '''
+    Return the language-server diagnostics for all MypyErrors of a check of
+    document run from base_dir, splitting the document into lines only once.
+    '''
+    line_index = lines.LineIndex(document.source)
+    diagnostics = []
+    for error in errors:
+        diag = error_to_diagnostic(error, document, line_index, base_dir)
+        if diag:
+            diagnostics.append(diag)
+    return diagnostics
+
+
 def parse_line(line, document=None):
     '''
     Return a language-server diagnostic from a line of the Mypy error report;
     optionally, use the whole document to provide more context on it.
     '''
-    result = re.match(line_pattern, line)
-    if result:
-        file_path, lineno, offset, severity, msg = result.groups()
-
-        if file_path != "<string>":  # live mode
-            # results from other files can be included, but we cannot return
-            # them.
-            if document and document.path and not document.path.endswith(
-                    file_path):
-                log.warning("discarding result for %s against %s", file_path,
-                            document.path)
-                return None
-
-        lineno = int(lineno or 1) - 1  # 0-based line number
-        offset = int(offset or 1) - 1  # 0-based offset
-        errno = 2
-        if severity == 'error':
-            errno = 1
-        diag = {
-            'source': 'mypy',
-            'range': {
-                'start': {'line': lineno, 'character': offset},
-                # There may be a better solution, but mypy does not provide end
-                'end': {'line': lineno, 'character': offset + 1}
-            },
-            'message': msg,
-            'severity': errno
-        }
-        if document:
-            # although mypy does not provide the end of the affected range, we
-            # can make a good guess by highlighting the word that Mypy flagged
-            word = document.word_at_position(diag['range']['start'])
-            if word:
-                diag['range']['end']['character'] = (
-                    diag['range']['start']['character'] + len(word))
-
-        return diag
+    error = report.parse_error_line(line)
+    if error:
+        return error_to_diagnostic(error, document)
+    return None
 
 
-@hookimpl
-def pyls_lint(config, workspace, document, is_saved):
-    settings = config.plugin_settings('pyls_mypy')
+_servers = {
+    'dmypy': daemon.get_daemon,
+    'fine_grained': engine.get_engine,
+}
+
+
+def _workspace_root(workspace, document):
+    if workspace is not None and workspace.root_path:
+        return workspace.root_path
+    if document.path:
+        return os.path.dirname(document.path)
+    return os.getcwd()
+
+
+def _server_flags(settings):
+    # The mypy server does not support --follow-imports silent; errors in
+    # imported modules are reported but not returned for this document.
+    flags = report.text_report_flags() + [
+        '--follow-imports', settings.get('follow_imports', 'normal')]
+    if settings.get('strict', False):
+        flags.append('--strict')
+    return flags
+
+
+def _server_run(backend, settings, root, flags, paths):
+    def run(timings, cancel=None):
+        with timings.stage('mypy'):
+            server = _servers[backend](root, flags)
+            server.supervisor.configure(
+                settings.get('max_checks', supervisor.DEFAULT_MAX_CHECKS),
+                settings.get('max_rss_mb', supervisor.DEFAULT_MAX_RSS_MB))
+            # Following imports, mypy looks at every module anyway
+            server.watcher = watcher.get_watcher(
+                root, settings.get('watch_interval',
+                                   watcher.DEFAULT_POLL_INTERVAL)) \
+                if settings.get('watch', True) and \
+                not watcher.follows_imports(flags) else None
+            text, errors, status = server.check(paths)
+        with timings.stage('parse'):
+            return report.parse_report(text), errors, status
+
+    return run
+
+
+def _server_dir(backend, root):
+    # Where mypy reads its config and reports paths relative to: dmypy runs
+    # from the workspace root, the engine from the cwd of pyls
+    return root if backend == 'dmypy' else os.getcwd()
+
+
+def _server_check(backend, settings, workspace, document, is_saved):
+    # Both dmypy and the fine-grained engine check files on disk, so unsaved
+    # edits cannot be seen.
+    if not is_saved or not document.path:
+        return None
+    flags = _server_flags(settings)
+    root = _workspace_root(workspace, document)
+    return flags, _server_dir(backend, root), _server_run(
+        backend, settings, root, flags, [document.path]), []
+
+
+def _api_flags(settings, root=None):
+    flags = ['--incremental',
+             '--show-column-numbers',
+             '--follow-imports', 'silent']
+    if settings.get('strict', False):
+        flags.append('--strict')
+    if settings.get('sqlite_cache', False):
+        flags.append('--sqlite-cache')
+    if root and settings.get('branch_caches', True):
+        cache_dir = cachedir.cache_dir(
+            root, settings.get('cache_slots', cachedir.DEFAULT_SLOTS))
+        if cache_dir:
+            flags.extend(['--cache-dir', cache_dir])
+    return flags
+
+
+def _cache_dir(flags):
+    if '--cache-dir' in flags:
+        return flags[flags.index('--cache-dir') + 1]
+    return os.path.join(os.getcwd(), '.mypy_cache')
+
+
+@contextlib.contextmanager
+def _cache_lock(flags):
+    # Keep other pyls instances from vacuuming a SQLite cache while in use
+    if '--sqlite-cache' not in flags:
+        yield
+        return
+    with sqlitecache.locked(_cache_dir(flags)):
+        yield
+
+
+def _cache_dirs(settings, root):
+    # The caches of all branches, and the one used without branch caches.
+    # Modules only found on other branches are not gone from their caches.
+    current = cachedir.current_slot(root)
+    cache_dirs = [(path, path == current)
+                  for path in cachedir.slot_dirs(root)]
+    default = _cache_dir(_api_flags(dict(settings, branch_caches=False)))
+    if os.path.isdir(default):
+        cache_dirs.append((default, True))
+    return cache_dirs
+
+
+def _root_path(workspace):
+    return workspace.root_path if workspace is not None else None
+
+
+def _forkserver_run(settings):
+    timeout = settings.get('timeout', forkserver.DEFAULT_TIMEOUT)
+
+    def run(args, timings, cancel):
+        with timings.stage('mypy'):
+            return forkserver.get_forkserver().run(args, timeout, cancel)
+
+    return run
+
+
+def _api_runner():
+    def run(args, timings, cancel):
+        if cancel is not None and forkserver.available():
+            # mypy cannot be stopped in the pyls process: a check that can
+            # be cancelled runs in a child, without the forkserver timeout
+            with timings.stage('mypy'):
+                return forkserver.get_forkserver().run(args, None, cancel)
+        return report.run(args, timings)
+
+    return run
+
+
+def _mypy_runner(settings):
+    if settings.get('backend', 'api') == 'forkserver' and \
+            forkserver.available():
+        return _forkserver_run(settings)
+    return _api_runner()
+
+
+def _api_files(settings, document, is_saved):
+    '''
+    Return the mypy options and the paths naming document, and the (path,
+    source) pairs of the shadow files they refer to; or None if the
+    document should not be checked.
+    '''
     live_mode = settings.get('live_mode', True)
+    # Read the text once: the document may change while a check is pending
+    source = document.source
+    if live_mode and document.path and os.path.isfile(document.path):
+        # Check the unsaved buffer under its real path, so that imports are
+        # followed and the cache is shared with checks of saved files.
+        return (['--shadow-file', document.path,
+                 shadow.shadow_path(document.path, source)],
+                [document.path], [(document.path, source)])
     if live_mode:
-        args = ['--incremental',
-                '--show-column-numbers',
-                '--follow-imports', 'silent',
-                '--command', document.source]
-    elif is_saved:
-        args = ['--incremental',
-                '--show-column-numbers',
-                '--follow-imports', 'silent',
-                document.path]
-    else:
-        return []
+        return ['--command', source], [], []
+    if is_saved:
+        return [], [document.path], []
+    return None
 
-    if settings.get('strict', False):
-        args.append('--strict')
 
-    report, errors, _ = mypy_api.run(args)
+def _shared_cache(settings, workspace):
+    '''
+    Return the store shared with other workspaces for the cache of checks
+    with the given settings, or None if there is none.
+    '''
+    if not settings.get('shared_cache', False) or \
+            settings.get('sqlite_cache', False):
+        return None
+    root = _root_path(workspace)
+    directory = settings.get('shared_cache_dir') or \
+        sharedcache.default_directory()
+    flags = _api_flags(settings, root)
+    name = sharedcache.namespace(_api_flags(settings), os.getcwd())
+    return sharedcache.get_store(
+        os.path.expanduser(directory), name, _cache_dir(flags), root,
+        os.getcwd(), flags)
 
-    diagnostics = []
-    for line in report.splitlines():
-        diag = parse_line(line, document)
-        if diag:
-            diagnostics.append(diag)
 
+def _api_run(run_mypy, args, shadows, store=None):
+    def run(timings, cancel=None):
+        with shadow.shadowed(shadows), _cache_lock(args):
+            if store is not None:
+                with timings.stage('restore'):
+                    store.restore_once()
+            result = run_mypy(args, timings, cancel)
+        if store is not None:
+            store.export_later()
+        return result
+
+    return run
+
+
+def _other_shadows(settings, workspace, options, exclude):
+    '''
+    Return the mypy options shadowing the unsaved buffers of the open
+    documents other than the ones in exclude, with their (path, source)
+    pairs.
+    '''
+    if workspace is None or '--shadow-file' not in options or \
+            not settings.get('shadow_open_documents', True):
+        return [], []
+    others = shadow.dirty_documents(list(workspace.documents.values()),
+                                    exclude)
+    options = []
+    for path, source in others:
+        options.extend(['--shadow-file', path,
+                        shadow.shadow_path(path, source)])
+    return options, others
+
+
+def _api_check(settings, workspace, document, is_saved, run_mypy):
+    files = _api_files(settings, document, is_saved)
+    if files is None:
+        return None
+    options, paths, shadows = files
+    # Imports of modules with unsaved edits see the edited text
+    other_options, others = _other_shadows(settings, workspace, options,
+                                           [document.path])
+    args = _api_flags(settings, _root_path(workspace)) + options + \
+        other_options + paths
+    run = _api_run(run_mypy, args, shadows + others,
+                   _shared_cache(settings, workspace))
+    return args, os.getcwd(), run, others
+
+
+def _prepare_check(settings, workspace, document, is_saved):
+    '''
+    Return the mypy arguments for checking document, the directory mypy looks
+    for its config in, a function running the check and recording its stages
+    in a stats.Timings, and the (path, source) pairs of the other documents
+    the check sees unsaved; or None if the document should not be checked.
+    The check function stops early, where it can, once its optional cancel
+    event is set.
+    '''
+    backend = settings.get('backend', 'api')
+    if backend in _servers:
+        return _server_check(backend, settings, workspace, document, is_saved)
+    return _api_check(settings, workspace, document, is_saved,
+                      _mypy_runner(settings))
+
+
+def _batch_key(settings, workspace, args, config_dir):
+    '''
+    Return what checks must have in common to be run by a single mypy
+    invocation, or None if the check cannot be shared.
+    '''
+    if '--command' in args:
+        # A document without a file cannot be told apart from others
+        return None
+    backend = settings.get('backend', 'api')
+    if backend in _servers:
+        root = _root_path(workspace)
+        if not root:
+            # Each document would be checked by the server of its directory
+            return None
+        return backend, root, config_dir, tuple(_server_flags(settings))
+    flags = _api_flags(settings, _root_path(workspace))
+    return backend, config_dir, tuple(flags)
+
+
+def _prepare_batch(settings, workspace, parts):
+    '''
+    Return a function running a single check of the documents of all parts,
+    like the ones _prepare_check returns.
+    '''
+    backend = settings.get('backend', 'api')
+    if backend in _servers:
+        root = _workspace_root(workspace, parts[0].snapshot)
+        paths = [part.snapshot.path for part in parts]
+        return _server_run(backend, settings, root, _server_flags(settings),
+                           paths)
+    # mypy takes all options before the files
+    options, paths, shadows = _api_flags(settings, _root_path(workspace)), \
+        [], []
+    for part in parts:
+        files = _api_files(settings, part.snapshot, part.is_saved)
+        options.extend(files[0])
+        paths.extend(files[1])
+        shadows.extend(files[2])
+    other_options, others = _other_shadows(settings, workspace, options,
+                                           paths)
+    return _api_run(_mypy_runner(settings), options + other_options + paths,
+                    shadows + others, _shared_cache(settings, workspace))
+
+
+def _record(document, timings):
+    stats.registry.record(timings)
+    log.debug("mypy lint of %s took %.3fs: %s", document.uri, timings.total,
+              timings)
+
+
+def _lint(snapshot, document, key, run, diagnostics_cache, timings,
+          drop_stale=False, cancel=None, route=None, persist=None,
+          base_dir=None):
+    '''
+    Run a check of snapshot and return its diagnostics.
+
+    If document moved on while mypy was running, the result is either
+    dropped (returning None) before any more work is spent on it, or has its
+    diagnostics moved to where the checked lines are now.
+
+    Errors that mypy reported for other files are passed to route, and the
+    diagnostics of a successful check to persist, if given. Relative error
+    paths are relative to base_dir, where mypy ran.
+    '''
+    with warmup.foreground():
+        mypy_errors, errors, status = run(timings, cancel)
+
+    if drop_stale and stale.is_stale(snapshot, document):
+        log.debug("dropping result for %s version %s", snapshot.uri,
+                  snapshot.version)
+        stats.registry.incr('stale_dropped')
+        _record(snapshot, timings)
+        return None
+
+    with timings.stage('ranges'):
+        diagnostics = errors_to_diagnostics(mypy_errors, snapshot, base_dir)
+
+    # Exit status 2 means mypy itself failed; do not keep that around.
+    if status != 2:
+        diagnostics_cache.put(key, diagnostics)
+        if persist is not None:
+            persist(diagnostics)
+        if route is not None:
+            with timings.stage('route'):
+                route([error for error in mypy_errors
+                       if not _is_for_document(error, snapshot, base_dir)])
+
+    if stale.is_stale(snapshot, document):
+        stats.registry.incr('stale_remapped')
+        with timings.stage('ranges'):
+            diagnostics = stale.remap(diagnostics, snapshot.source,
+                                      document.source)
+    _record(snapshot, timings)
     return diagnostics
+
+
+def _route_cross_file(config, workspace, settings, base_dir, complete,
+                      errors, checked=()):
+    '''
+    Publish the diagnostics a check produced for files other than the one
+    checked.
+
+    Closed files get their diagnostics published directly. Open documents
+    whose text is what is on disk get them through the diagnostics cache and
+    are linted again, so that other linters' results are kept. When complete
+    is set, the check reported on the whole build, so files that it no
+    longer reports on have their earlier diagnostics cleared; otherwise,
+    only the files in checked are.
+    '''
+    root = workspace.root_path
+    by_path = {}
+    for error in errors:
+        path = os.path.normpath(os.path.join(base_dir, error.path))
+        if path.startswith(os.path.join(root, '')):
+            by_path.setdefault(path, []).append(error)
+    for path in crossfile.published(root):
+        if complete or path in checked:
+            by_path.setdefault(path, [])
+
+    diagnostics_cache = cache.diagnostics_cache
+    for path, path_errors in by_path.items():
+        doc_uri = uris.from_fs_path(path)
+        document = workspace.documents.get(doc_uri)
+        if document is None:
+            if not os.path.isfile(path):
+                crossfile.update(root, path, [])
+                continue
+            diagnostics = errors_to_diagnostics(
+                path_errors, workspace.get_document(doc_uri), base_dir)
+            workspace.publish_diagnostics(doc_uri, diagnostics)
+            crossfile.update(root, path, diagnostics)
+            continue
+
+        # Without the cache, linting the document again would check it again
+        if not diagnostics_cache.maxsize:
+            continue
+        snapshot = copy.copy(document)
+        try:
+            with open(path, encoding='utf-8') as f:
+                if f.read() != snapshot.source:
+                    # The errors are for the saved file, not the buffer
+                    continue
+        except (IOError, OSError, UnicodeDecodeError):
+            continue
+        check = _prepare_check(settings, workspace, snapshot, True)
+        if check is None:
+            continue
+        key = cache.cache_key(settings.get('backend', 'api'), check[0],
+                              snapshot, check[1], check[3])
+        diagnostics = errors_to_diagnostics(path_errors, snapshot, base_dir)
+        diagnostics_cache.put(key, diagnostics)
+        crossfile.update(root, path, diagnostics)
+        thread = threading.Thread(target=_relint, name='pyls_mypy-relint',
+                                  args=(config, workspace, doc_uri, True))
+        thread.daemon = True
+        thread.start()
+    stats.registry.incr('cross_file_published', len(by_path))
+
+
+def _single_flight(key, run, timings, cancel=None):
+    # Exit status 2 means mypy itself failed, e.g. it timed out or crashed
+    return cache.single_flight.do(key, lambda: run(timings, cancel), cancel,
+                                  lambda result: result[2] != 2)
+
+
+# What a background check contributes to a batch of checks
+_Part = collections.namedtuple(
+    '_Part', ['snapshot', 'document', 'key', 'is_saved', 'timings', 'route',
+              'base_dir'])
+
+
+def _lint_batch(settings, workspace, checks):
+    '''
+    Check the documents of several background checks with a single mypy run
+    and return the diagnostics of each, as _lint would.
+    '''
+    parts = [check.part for check in checks]
+    batch_run = _prepare_batch(settings, workspace, parts)
+    result = []
+
+    def run(timings, cancel=None):
+        # Only the first document runs mypy, the others share its report
+        if not result:
+            result.append(batch_run(timings, cancel))
+        return result[0]
+
+    # Checks are only batched when mypy runs from the same directory
+    route, base_dir = parts[0].route, parts[0].base_dir
+    if route is not None:
+        snapshots = [part.snapshot for part in parts]
+
+        def route_others(errors):
+            route([error for error in errors
+                   if not any(_is_for_document(error, snapshot, base_dir)
+                              for snapshot in snapshots)])
+
+    stats.registry.incr('coalesced', len(parts) - 1)
+    return [_lint(part.snapshot, part.document, part.key, run,
+                  cache.diagnostics_cache, part.timings, drop_stale=True,
+                  route=route_others if route is not None and i == 0
+                  else None, base_dir=base_dir)
+            for i, part in enumerate(parts)]
+
+
+def _relint(config, workspace, doc_uri, is_saved):
+    '''
+    Lint a document with all pyls linters again and publish the results, the
+    same way pyls does after a change.
+    '''
+    if doc_uri not in workspace.documents:
+        worker.checker.forget(doc_uri)
+        return
+    hook = config.plugin_manager.subset_hook_caller('pyls_lint',
+                                                    config.disabled_plugins)
+    results = hook(config=config, workspace=workspace,
+                   document=workspace.get_document(doc_uri),
+                   is_saved=is_saved)
+    workspace.publish_diagnostics(
+        doc_uri, [diag for result in results for diag in result])
+
+
+def _persisted(settings, workspace, snapshot, config_dir, others):
+    '''
+    Return the store keeping the diagnostics of snapshot across sessions and
+    the key they are stored under, or None if they are not kept.
+    '''
+    if not settings.get('persist_diagnostics', False) or \
+            not snapshot.path or others:
+        # Unsaved edits of other documents are gone after a restart
+        return None
+    backend = settings.get('backend', 'api')
+    flags = _server_flags(settings) if backend in _servers else \
+        _api_flags(settings, _root_path(workspace))
+    diagnostics_store = store.get_store(
+        os.path.expanduser(settings.get('diagnostics_store') or
+                           store.default_path()),
+        settings.get('diagnostics_store_size', store.DEFAULT_MAX_ENTRIES))
+    return diagnostics_store, cache.cache_key(backend, flags, snapshot,
+                                              config_dir)
+
+
+def _keep_saved_result(snapshot, persist, diagnostics):
+    stale.saved_results.put(snapshot.path, snapshot.source, diagnostics)
+    if persist is not None:
+        persist(diagnostics)
+
+
+def _revalidate(config, workspace, document, is_saved, stored, lint):
+    '''
+    Run lint in the background in place of the stored diagnostics served
+    for document, and lint the document again if they changed.
+    '''
+    def run():
+        try:
+            diagnostics = lint()
+            if diagnostics is not None and diagnostics != stored:
+                _relint(config, workspace, document.uri, is_saved)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("revalidating %s failed", document.uri)
+
+    thread = threading.Thread(target=run, name='pyls_mypy-revalidate')
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _warm_servers(backend, root, flags):
+    report.preload()
+    if backend == 'dmypy':
+        daemon.get_daemon(root, flags).warm()
+    elif backend == 'fine_grained':
+        engine.preload()
+
+
+@hookimpl
+def pyls_initialize(config, workspace):
+    settings = config.plugin_settings('pyls_mypy')
+    if settings.get('sqlite_cache', False):
+        thread = threading.Thread(
+            target=sqlitecache.vacuum, name='pyls_mypy-vacuum',
+            args=(_cache_dir(_api_flags(settings, workspace.root_path)),))
+        thread.daemon = True
+        thread.start()
+    if settings.get('cache_gc', True) and workspace.root_path:
+        cachegc.start(workspace.root_path, cachegc.Collector(
+            functools.partial(_cache_dirs, settings, workspace.root_path),
+            os.getcwd(),
+            settings.get('cache_max_age_days', cachegc.DEFAULT_MAX_AGE_DAYS),
+            settings.get('cache_gc_interval', cachegc.DEFAULT_INTERVAL)))
+    if not settings.get('warmup', False) or not workspace.root_path:
+        return
+    warmup.cancel_all()
+    root = workspace.root_path
+    backend = settings.get('backend', 'api')
+
+    if backend in _servers:
+        # The servers keep their state in memory instead of mypy's cache, so
+        # get them started instead.
+        thread = threading.Thread(
+            target=_warm_servers, name='pyls_mypy-warmup',
+            args=(backend, root, _server_flags(settings)))
+        thread.daemon = True
+        thread.start()
+        return
+
+    if backend == 'forkserver' and forkserver.available():
+        thread = threading.Thread(
+            target=forkserver.get_forkserver().warm, name='pyls_mypy-warmup')
+        thread.daemon = True
+        thread.start()
+
+    roots = [os.path.join(root, path)
+             for path in settings.get('warmup_roots', ['.'])]
+    flags = _api_flags(settings, root)
+    # mypy keeps a SQLite cache locked for writing until its build is done
+    lock = sqlitecache.locked(_cache_dir(flags), exclusive=True) \
+        if '--sqlite-cache' in flags else None
+    warmup.Warmup(flags, roots, os.getcwd(), lock).start()
+
+
+CHECK_WORKSPACE = 'pyls_mypy.checkWorkspace'
+
+_workspace_check_lock = threading.Lock()
+
+
+def _check_workspace(config, workspace, settings):
+    '''
+    Check every module of the workspace, publishing the diagnostics of each
+    shard of it as soon as it is done.
+    '''
+    if not _workspace_check_lock.acquire(False):
+        workspace.show_message('mypy is already checking the workspace')
+        return
+    try:
+        timings = stats.Timings()
+        jobs = settings.get('jobs') or os.cpu_count() or 1
+        with timings.stage('plan'):
+            shards = project.plan(workspace.root_path, jobs)
+        files = sum(len(paths) for paths in shards)
+        log.info("checking %d files of %s in %d shards", files,
+                 workspace.root_path, len(shards))
+        count = failed = 0
+        flags = _api_flags(settings, workspace.root_path)
+        with timings.stage('mypy'), _cache_lock(flags):
+            for paths, (mypy_errors, errors, status) in project.check(
+                    shards, flags, jobs):
+                if status == 2:
+                    log.warning("mypy failed on %d files: %s", len(paths),
+                                errors)
+                    failed += len(paths)
+                    continue
+                count += len(mypy_errors)
+                _route_cross_file(config, workspace, settings, os.getcwd(),
+                                  False, mypy_errors, set(paths))
+        stats.registry.incr('workspace_checks')
+        log.info("mypy workspace check took %.3fs: %s", timings.total,
+                 timings)
+        message = 'mypy found %d errors in %d files' % (count, files)
+        if failed:
+            message += ' (%d files could not be checked)' % failed
+        workspace.show_message(message)
+    except Exception:  # pylint: disable=broad-except
+        log.exception("mypy workspace check failed")
+        workspace.show_message('mypy could not check the workspace')
+    finally:
+        _workspace_check_lock.release()
+
+
+@hookimpl
+def pyls_commands(config, workspace):
+    return [CHECK_WORKSPACE]
+
+
+@hookimpl
+def pyls_execute_command(config, workspace, command, arguments):
+    if command != CHECK_WORKSPACE or not workspace.root_path:
+        return None
+    # The check can take minutes; its diagnostics are published as they
+    # come instead of being returned.
+    thread = threading.Thread(
+        target=_check_workspace, name='pyls_mypy-workspace',
+        args=(config, workspace, config.plugin_settings('pyls_mypy')))
+    thread.daemon = True
+    thread.start()
+    return None
+
+
+@hookimpl
+def pyls_lint(config, workspace, document, is_saved):
+    timings = stats.Timings()
+    with timings.stage('settings'):
+        settings = config.plugin_settings('pyls_mypy')
+        # The document is updated in place by pyls, so check and convert the
+        # report against a copy of the version being linted.
+        snapshot = copy.copy(document)
+        backend = settings.get('backend', 'api')
+        check = _prepare_check(settings, workspace, snapshot, is_saved)
+        if check is None:
+            if backend in _servers and snapshot.path:
+                # Servers only see the file on disk: show what they found
+                # there until it is saved again
+                return stale.saved_results.get(snapshot.path,
+                                               snapshot.source)
+            return []
+        args, config_dir, run, others = check
+
+        diagnostics_cache = cache.diagnostics_cache
+        diagnostics_cache.resize(settings.get('cache_size',
+                                              cache.DEFAULT_CACHE_SIZE))
+        key = cache.cache_key(backend, args, snapshot,
+                              config_dir, others)
+        persisted = _persisted(settings, workspace, snapshot, config_dir,
+                               others)
+        persist = functools.partial(persisted[0].put, snapshot.path,
+                                    persisted[1]) if persisted else None
+        if backend in _servers:
+            persist = functools.partial(_keep_saved_result, snapshot, persist)
+    diagnostics = diagnostics_cache.get(key)
+    if diagnostics is not None:
+        if persist is not None:
+            # e.g. the result of a background check being published
+            persist(diagnostics)
+        _record(snapshot, timings)
+        return diagnostics
+
+    # After a restart, the diagnostics stored for the same text stand in
+    # until a check confirms them.
+    stored = persisted[0].take(snapshot.path, persisted[1]) \
+        if persisted else None
+
+    # Checks of the same text with the same arguments, e.g. on open and then
+    # on save, share a single mypy run when they overlap.
+    run = functools.partial(_single_flight, key, run)
+
+    route = None
+    if workspace is not None and workspace.root_path and \
+            settings.get('cross_file', True):
+        route = functools.partial(
+            _route_cross_file, config, workspace, settings, config_dir,
+            backend in _servers)
+
+    if not settings.get('background', False) or workspace is None:
+        if stored is not None and workspace is not None:
+            _revalidate(config, workspace, document, is_saved, stored,
+                        functools.partial(
+                            _lint, snapshot, document, key, run,
+                            diagnostics_cache, timings, route=route,
+                            persist=persist, base_dir=config_dir))
+            return stored
+        return _lint(snapshot, document, key, run, diagnostics_cache, timings,
+                     route=route, persist=persist, base_dir=config_dir)
+
+    checker = worker.checker
+    diagnostics = checker.result(document.uri, key)
+    if diagnostics is not None:
+        if persist is not None:
+            persist(diagnostics)
+        _record(snapshot, timings)
+        return diagnostics
+
+    # A stale background result is dropped: the change that made it stale
+    # has already been linted again.
+    cancel = threading.Event()
+    checker.submit(
+        worker.Check(
+            document.uri, key,
+            lambda: _lint(snapshot, document, key, run, diagnostics_cache,
+                          timings, drop_stale=True, cancel=cancel,
+                          route=route, persist=persist, base_dir=config_dir),
+            lambda: _relint(config, workspace, document.uri, is_saved),
+            cancel, _batch_key(settings, workspace, args, config_dir),
+            functools.partial(_lint_batch, settings, workspace),
+            _Part(snapshot, document, key, is_saved, timings, route,
+                  config_dir)),
+        settings.get('debounce', worker.DEFAULT_DEBOUNCE),
+        settings.get('coalesce_window', worker.DEFAULT_WINDOW))
+    # Keep showing what we had until the check is done
+    return checker.last_result(document.uri) or stored or []
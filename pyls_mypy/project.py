@@ -0,0 +1,266 @@
+import ast
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent import futures
+
+from pyls_mypy import forkserver, report
+
+log = logging.getLogger(__name__)
+
+# Directories that never hold modules of the workspace itself
+SKIP_DIRS = {'.git', '.hg', '.svn', '.tox', '.nox', '.mypy_cache',
+             '.pytest_cache', '__pycache__', 'node_modules', 'build', 'dist'}
+SOURCE_EXTENSIONS = ('.py', '.pyi')
+
+# The (mtime, size) of each file last parsed, and the names it imports
+_imports = {}
+_imports_lock = threading.Lock()
+
+
+def module_name(path):
+    '''
+    Return the module name of the file at path, the way mypy finds it: the
+    path relative to the closest directory that is not a package.
+    '''
+    directory, filename = os.path.split(os.path.abspath(path))
+    parts = [os.path.splitext(filename)[0]]
+    if parts[0] == '__init__':
+        parts = []
+    while os.path.isfile(os.path.join(directory, '__init__.py')):
+        directory, package = os.path.split(directory)
+        parts.insert(0, package)
+    return '.'.join(parts)
+
+
+def find_modules(root):
+    '''
+    Return a dict of module names to the paths of the Python files under
+    root defining them, skipping virtualenvs and the directories of tools.
+    '''
+    modules = {}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            name for name in dirnames
+            if name not in SKIP_DIRS and not name.startswith('.') and
+            not os.path.isfile(os.path.join(directory, name, 'pyvenv.cfg')))
+        for filename in sorted(filenames):
+            if filename.endswith(SOURCE_EXTENSIONS):
+                path = os.path.join(directory, filename)
+                modules.setdefault(module_name(path), []).append(path)
+    return modules
+
+
+def _imported_names(path, name, source=None):
+    try:
+        if source is None:
+            with open(path, 'rb') as f:
+                source = f.read()
+        tree = ast.parse(source, path or '<string>')
+    except (SyntaxError, ValueError, IOError, OSError):
+        return
+    package = name if path and path.endswith(('__init__.py', '__init__.pyi')) \
+        else name.rpartition('.')[0]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                parts = package.split('.') if package else []
+                parts = parts[:len(parts) - (node.level - 1)]
+                base = '.'.join(parts + ([base] if base else []))
+            if base:
+                yield base
+            for alias in node.names:
+                yield '%s.%s' % (base, alias.name) if base else alias.name
+
+
+def import_graph(modules):
+    '''
+    Return the imports between modules, as a dict of each path to the paths
+    of the workspace modules it imports.
+    '''
+    graph = {}
+    for name, paths in modules.items():
+        for path in paths:
+            imported = graph.setdefault(path, set())
+            for imported_name in _imported_names(path, name):
+                # Importing a.b.c also imports a and a.b
+                parts = imported_name.split('.')
+                for i in range(1, len(parts) + 1):
+                    imported.update(modules.get('.'.join(parts[:i]), ()))
+            imported.discard(path)
+    return graph
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _file_imports(path, stamp):
+    with _imports_lock:
+        cached = _imports.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    names = list(_imported_names(path, module_name(path)))
+    with _imports_lock:
+        _imports[path] = (stamp, names)
+    return names
+
+
+def _module_files(name, search_dirs):
+    # The files mypy may find for name and the packages containing it
+    parts = name.split('.')
+    for directory in search_dirs:
+        for i in range(1, len(parts) + 1):
+            base = os.path.join(directory, *parts[:i])
+            for extension in SOURCE_EXTENSIONS:
+                yield base + extension
+                yield os.path.join(base, '__init__' + extension)
+
+
+def dependency_stamps(path, source, search_dirs):
+    '''
+    Return the (path, mtime, size) of the files under search_dirs that the
+    module at path with the given source imports, directly or not. Modules
+    installed elsewhere, e.g. in site-packages, are left out.
+
+    mypy does not look at these stamps: they tell whether a check of the
+    module could report something else than the last time.
+    '''
+    if path:
+        # mypy also looks for imports next to the top package of a module
+        top = path
+        for _ in module_name(path).split('.'):
+            top = os.path.dirname(top)
+        search_dirs = [top] + [d for d in search_dirs if d != top]
+    names = list(_imported_names(path, module_name(path) if path else '',
+                                 source))
+    stamps = {}
+    seen = set()
+    while names:
+        name = names.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        for candidate in _module_files(name, search_dirs):
+            if candidate in stamps or candidate == path:
+                continue
+            stamp = _stamp(candidate)
+            if stamp is None:
+                continue
+            stamps[candidate] = stamp
+            names.extend(_file_imports(candidate, stamp))
+    return sorted((candidate,) + stamp
+                  for candidate, stamp in stamps.items())
+
+
+def components(graph):
+    '''
+    Return the connected components of an import graph, as lists of paths:
+    modules of different components can be checked separately.
+    '''
+    parents = {path: path for path in graph}
+
+    def find(path):
+        while parents[path] != path:
+            parents[path] = parents[parents[path]]
+            path = parents[path]
+        return path
+
+    for path, imported in graph.items():
+        for other in imported:
+            parents[find(other)] = find(path)
+
+    groups = {}
+    for path in sorted(graph):
+        groups.setdefault(find(path), []).append(path)
+    return list(groups.values())
+
+
+def shard(groups, count):
+    '''
+    Spread groups of paths over at most count shards of about the same
+    number of files, keeping each group in a single shard.
+    '''
+    shards = [[] for _ in range(max(1, count))]
+    for group in sorted(groups, key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return [paths for paths in shards if paths]
+
+
+def separate_duplicates(shards):
+    '''
+    Split shards so that none has two files of the same module name, e.g.
+    two conftest.py outside of packages, which mypy refuses to check in a
+    single run.
+    '''
+    result = []
+    for paths in shards:
+        runs = []
+        for path in paths:
+            name = module_name(path)
+            for names, run in runs:
+                if name not in names:
+                    names.add(name)
+                    run.append(path)
+                    break
+            else:
+                runs.append(({name}, [path]))
+        result.extend(run for _, run in runs)
+    return result
+
+
+def plan(root, count):
+    '''
+    Return the shards to check the whole workspace at root with.
+    '''
+    return separate_duplicates(
+        shard(components(import_graph(find_modules(root))), count))
+
+
+def _context():
+    if forkserver.available():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(forkserver.PRELOAD)
+        return context
+    return multiprocessing.get_context()
+
+
+def check(shards, args, jobs):
+    '''
+    Check each shard with mypy and args in a pool of jobs processes,
+    yielding the paths of each shard with its report.run result as soon as
+    the shard is done.
+
+    All shards run with the same mypy cache, so modules outside the
+    workspace that several shards import are only analyzed once. Shards
+    that could not be checked have mypy's failure status.
+    '''
+    with futures.ProcessPoolExecutor(max_workers=max(1, jobs),
+                                     mp_context=_context()) as pool:
+        pending = {}
+        for paths in shards:
+            try:
+                pending[pool.submit(report.run, list(args) + paths)] = paths
+            except RuntimeError:
+                # e.g. BrokenProcessPool, when a worker failed to start
+                log.exception("mypy check of %d files could not start",
+                              len(paths))
+                yield paths, ([], 'mypy check could not start',
+                              forkserver.FAILURE)
+        for future in futures.as_completed(pending):
+            paths = pending[future]
+            try:
+                result = future.result()
+            except Exception:  # pylint: disable=broad-except
+                log.exception("mypy check of %d files failed", len(paths))
+                result = [], 'mypy check failed', forkserver.FAILURE
+            yield paths, result
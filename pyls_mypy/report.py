@@ -0,0 +1,152 @@
+import collections
+import io
+import logging
+import re
+from contextlib import redirect_stderr, redirect_stdout
+
+from pyls_mypy import stats
+
+log = logging.getLogger(__name__)
+
+# path:line:column:end_line:end_column: severity: message  [code]
+# where everything after the path up to the severity is optional, and the
+# path may start with a Windows drive letter.
+line_pattern = re.compile(
+    r"^((?:[A-Za-z]:)?[^:]+):(?:(\d+):)?(?:(\d+):)?(?:(\d+):(\d+):)?"
+    r" (\w+): (.*?)(?:  \[([\w-]+)\])?$")
+
+_text_report_flags = None
+
+MypyError = collections.namedtuple('MypyError', [
+    'path', 'line', 'column', 'end_line', 'end_column', 'severity',
+    'message', 'code'])
+MypyError.__doc__ = '''
+A single mypy message. Lines and columns are 1-based as mypy reports them
+(so end_column is inclusive), and any of them is None when mypy did not
+report it.
+'''
+
+
+def preload():
+    '''
+    Import the parts of mypy needed to run it. mypy is only imported when it
+    is first needed, as importing it takes longer than starting pyls.
+    '''
+    # pylint: disable=unused-import
+    from mypy import build, main  # noqa: F401
+
+
+def text_report_flags():
+    '''
+    Return the flags making mypy's text report carry everything MypyError
+    holds, as far as the installed mypy supports them.
+    '''
+    global _text_report_flags  # pylint: disable=global-statement
+    if _text_report_flags is None:
+        from mypy.options import Options
+        flags = ['--show-column-numbers', '--show-error-codes']
+        if hasattr(Options(), 'show_error_end'):
+            flags.append('--show-error-end')
+        _text_report_flags = flags
+    return list(_text_report_flags)
+
+
+def _int(value):
+    return int(value) if value else None
+
+
+def parse_error_line(line):
+    '''
+    Return the MypyError for a line of a mypy text report, or None if the line
+    is not a message (e.g. the summary line).
+    '''
+    result = line_pattern.match(line)
+    if not result:
+        return None
+    (path, lineno, column, end_line, end_column, severity, message,
+     code) = result.groups()
+    return MypyError(path, _int(lineno), _int(column), _int(end_line),
+                     _int(end_column), severity, message, code)
+
+
+def parse_report(report):
+    '''
+    Return the MypyErrors of a mypy text report.
+    '''
+    errors = []
+    for line in report.splitlines():
+        error = parse_error_line(line)
+        if error:
+            errors.append(error)
+    return errors
+
+
+def _from_error_info(info):
+    code = info.code.code if info.code is not None else None
+    end_line = getattr(info, 'end_line', None)
+    end_column = getattr(info, 'end_column', None)
+    # mypy's ErrorInfo is 1-based for lines but 0-based for columns, with an
+    # exclusive end column, and uses -1 for unknown positions.
+    return MypyError(
+        info.file,
+        info.line if info.line >= 0 else None,
+        info.column + 1 if info.column >= 0 else None,
+        end_line if end_line and end_line >= 0 else None,
+        end_column if end_column and end_column >= 0 else None,
+        info.severity, info.message, code)
+
+
+def collect_errors(errors):
+    '''
+    Return the MypyErrors held by a mypy Errors object, in the order mypy
+    would report them.
+    '''
+    result = []
+    seen = set()
+    for infos in errors.error_info_map.values():
+        for info in infos:
+            if getattr(info, 'hidden', False):
+                continue
+            error = _from_error_info(info)
+            if error not in seen:
+                seen.add(error)
+                result.append(error)
+    result.sort(key=lambda e: (e.path, e.line or 0, e.column or 0))
+    return result
+
+
+def run(args, timings=None):
+    '''
+    Run mypy in-process with the given command line arguments, like
+    mypy.api.run, but return the MypyErrors of the build instead of a text
+    report: (mypy_errors, error_output, exit_status).
+
+    The time spent is recorded in timings, a stats.Timings, when given.
+    '''
+    from mypy import build, main
+    from mypy.errors import CompileError
+
+    timings = timings or stats.Timings()
+    stdout, stderr = io.StringIO(), io.StringIO()
+    try:
+        with timings.stage('mypy'), \
+                redirect_stdout(stdout), redirect_stderr(stderr):
+            sources, options = main.process_options(args)
+            try:
+                result = build.build(sources, options)
+            except CompileError as e:
+                # Blocking errors (e.g. syntax errors) only come as text
+                errors = parse_report('\n'.join(e.messages))
+                return errors, stderr.getvalue(), 1 if errors else 2
+    except SystemExit as e:
+        # Raised by mypy for invalid arguments and internal errors
+        output = stdout.getvalue() + stderr.getvalue()
+        status = e.code if isinstance(e.code, int) else 2
+        return parse_report(output), output, status
+    except Exception:  # pylint: disable=broad-except
+        log.exception("mypy failed")
+        return [], stderr.getvalue(), 2
+
+    with timings.stage('parse'):
+        errors = collect_errors(result.manager.errors)
+    return errors, stderr.getvalue(), 1 if errors else 0
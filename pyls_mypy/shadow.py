@@ -0,0 +1,126 @@
+import atexit
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+log = logging.getLogger(__name__)
+
+_shadow_dir = None
+_lock = threading.Lock()
+# The number of checks using each shadow file
+_users = {}
+
+
+def _directory():
+    global _shadow_dir  # pylint: disable=global-statement
+    with _lock:
+        if _shadow_dir is None:
+            _shadow_dir = tempfile.mkdtemp(prefix='pyls_mypy_shadow_')
+            atexit.register(shutil.rmtree, _shadow_dir, True)
+        return _shadow_dir
+
+
+def shadow_path(path, source):
+    '''
+    Return the shadow file holding source as the unsaved contents of path.
+    Checks of different texts of a file, which may run at the same time, get
+    different shadow files.
+    '''
+    digest = hashlib.sha1(path.encode('utf-8') + b'\0' +
+                          source.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(_directory(),
+                        digest + '-' + os.path.basename(path))
+
+
+def write_shadow(path, source):
+    '''
+    Write source as the shadow of path for a check and return the shadow
+    file's path; the check must remove_shadow it once done.
+    '''
+    shadow = shadow_path(path, source)
+    with _lock:
+        users = _users.get(shadow, 0)
+        _users[shadow] = users + 1
+        if not users:
+            with open(shadow, 'w', encoding='utf-8') as f:
+                f.write(source)
+    log.debug("shadowing %s with %s", path, shadow)
+    return shadow
+
+
+def remove_shadow(shadow):
+    '''
+    Remove a shadow file once no check uses it any more.
+    '''
+    with _lock:
+        _users[shadow] -= 1
+        if _users[shadow]:
+            return
+        del _users[shadow]
+        try:
+            os.remove(shadow)
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def shadowed(shadows):
+    '''
+    Keep the shadow files of the (path, source) pairs of a check for the
+    duration of the context.
+    '''
+    files = []
+    try:
+        for path, source in shadows:
+            files.append(write_shadow(path, source))
+        yield files
+    finally:
+        for shadow in files:
+            remove_shadow(shadow)
+
+
+_disk_digests = {}
+
+
+def _disk_digest(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _disk_digests.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+    with _lock:
+        _disk_digests[path] = (stamp, digest)
+    return digest
+
+
+def dirty_documents(documents, exclude=()):
+    '''
+    Return the (path, source) of every document whose text differs from its
+    Python file on disk, skipping the paths in exclude.
+    '''
+    dirty = []
+    for document in documents:
+        path = document.path
+        if not path or path in exclude or \
+                not path.endswith(('.py', '.pyi')):
+            continue
+        # Read the text once: the document may change in the meantime
+        source = document.source
+        disk_digest = _disk_digest(path)
+        if disk_digest is not None and disk_digest != hashlib.sha1(
+                source.encode('utf-8')).hexdigest():
+            dirty.append((path, source))
+    return dirty
@@ -0,0 +1,364 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+from pyls_mypy import cache, cachedir, stats
+
+log = logging.getLogger(__name__)
+
+# Least time between two exports of the same cache, in seconds
+EXPORT_INTERVAL = 10.0
+META_SUFFIX = '.meta.json'
+DATA_SUFFIX = '.data.json'
+DEPS_SUFFIX = '.deps.json'
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def default_directory():
+    return os.path.join(cachedir.user_cache_dir(), 'shared')
+
+
+def _digest(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _config_digest(config_dir):
+    # The contents, not the stamps: worktrees have their own copies
+    contents = []
+    for name in cache.config_files():
+        try:
+            with open(os.path.join(config_dir, os.path.expanduser(name)),
+                      'rb') as f:
+                contents.append((name, f.read()))
+        except (IOError, OSError):
+            continue
+    return _digest(*contents)
+
+
+def namespace(flags, config_dir):
+    '''
+    Return the part of the store that caches of mypy runs with flags from
+    config_dir can share: same mypy version, config, flags and Python
+    version.
+    '''
+    from mypy import version
+    return _digest(version.__version__, _config_digest(config_dir),
+                   list(flags), sys.version_info[:2])[:16]
+
+
+def cache_version(flags):
+    '''
+    Return the name of the directory that mypy run with flags from the
+    current directory keeps its cache in: the Python version it checks for.
+    '''
+    from mypy import main
+    out = io.StringIO()
+    try:
+        _, options = main.process_options(list(flags), stdout=out,
+                                          stderr=out, require_targets=False)
+    except SystemExit:
+        log.warning("could not read mypy options: %s", out.getvalue())
+        return '%d.%d' % sys.version_info[:2]
+    return '%d.%d' % options.python_version[:2]
+
+
+def source_hash(path):
+    '''
+    Return the hash mypy records in its cache for the source file at path.
+    '''
+    from mypy import util
+    with open(path, 'rb') as f:
+        return util.hash_digest(f.read())
+
+
+def _entry_names(module_id, path):
+    # Where mypy puts the cache of a module, see mypy.build.get_cache_names
+    prefix = os.path.join(*module_id.split('.'))
+    if os.path.basename(path).startswith('__init__.py'):
+        prefix = os.path.join(prefix, '__init__')
+    return prefix + META_SUFFIX, prefix + DATA_SUFFIX
+
+
+def _copy(sources, destinations):
+    # Data first: an entry is only complete once its meta is in place. The
+    # copies keep mtimes, which mypy checks against the meta.
+    for source, destination in zip(sources, destinations):
+        directory = os.path.dirname(destination)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copy2(source, tmp)
+            os.replace(tmp, destination)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def _write_json(path, content):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(content, f)
+    os.replace(tmp, path)
+
+
+class SharedCache(object):
+    '''
+    A content-addressed store of mypy cache entries shared by all the
+    workspaces on this machine, e.g. the worktrees of a repository.
+
+    Entries are addressed by module and source hash within a namespace for
+    the mypy version, config and flags, so that a workspace only gets
+    entries for the exact sources it has. mypy validates them like any
+    other entry of its cache, and rewrites their paths and mtimes.
+
+    mypy trusts an entry whose source is unchanged as long as the entries of
+    the modules it depends on are, so every entry is stored along with the
+    source hashes of its dependencies, and is only restored where they are
+    the same.
+    '''
+
+    def __init__(self, directory, name, cache_dir, root, base, version=None):
+        self.directory = os.path.join(directory, name)
+        self.cache_dir = os.path.join(
+            cache_dir, version or '%d.%d' % sys.version_info[:2])
+        self.root = root
+        self.base = base
+        self._lock = threading.Lock()
+        self._restored = False
+        self._exporting = False
+        self._exported = 0.0
+        self._since = 0.0
+
+    def _object(self, module_id, digest):
+        # The directory of the entries of a module, one per set of sources
+        # of its dependencies
+        key = _digest(module_id, digest)
+        return os.path.join(self.directory, 'objects', key[:2], key)
+
+    def _local_hash(self, module_id):
+        prefix = os.path.join(self.cache_dir, *module_id.split('.'))
+        for meta in (prefix + META_SUFFIX,
+                     os.path.join(prefix, '__init__' + META_SUFFIX)):
+            try:
+                with open(meta) as f:
+                    return json.load(f)['hash']
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                continue
+        return None
+
+    def _dependency_hashes(self, meta):
+        '''
+        Return the source hashes of the modules the cache entry with meta
+        depends on, from their entries in the cache, or None if one of them
+        has none.
+        '''
+        hashes = {}
+        for module_id in meta.get('dependencies', []):
+            hashes[module_id] = self._local_hash(module_id)
+            if hashes[module_id] is None:
+                return None
+        return hashes
+
+    def _index(self, module_id, path):
+        return os.path.join(self.directory, 'index',
+                            _digest(module_id, path) + '.json')
+
+    def _path_key(self, path):
+        # Workspace modules are known by their path within the workspace
+        path = os.path.normpath(os.path.join(self.base, path))
+        if self.root and path.startswith(os.path.join(self.root, '')):
+            return os.path.relpath(path, self.root)
+        return path
+
+    def _write_index(self, module_id, path):
+        index = self._index(module_id, path)
+        if not os.path.exists(index):
+            _write_json(index, {'id': module_id, 'path': path})
+
+    def _read_index(self):
+        # The (module, path) of every entry of the store that exists here
+        index_dir = os.path.join(self.directory, 'index')
+        try:
+            names = os.listdir(index_dir)
+        except OSError:
+            return []
+        modules = []
+        for name in names:
+            try:
+                with open(os.path.join(index_dir, name)) as f:
+                    index = json.load(f)
+                module_id, path = index['id'], index['path']
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                continue
+            if not os.path.isabs(path):
+                if not self.root:
+                    continue
+                path = os.path.join(self.root, path)
+            if os.path.exists(path):
+                modules.append((module_id, path))
+        return modules
+
+    def restore(self):
+        '''
+        Copy the entries of the store for modules missing from the cache
+        whose sources, and those of the modules they depend on, are the same
+        as here; return how many were copied.
+        '''
+        modules = self._read_index()
+        paths = {}
+        for module_id, path in modules:
+            paths.setdefault(module_id, []).append(path)
+        hashes = {}
+
+        def current_hash(path):
+            if path not in hashes:
+                try:
+                    hashes[path] = source_hash(path)
+                except (IOError, OSError):
+                    hashes[path] = None
+            return hashes[path]
+
+        def matches(dependencies):
+            # Where several files are known for a module, they must all
+            # match, as it is not known which one mypy finds here
+            return all(paths.get(module_id) and
+                       all(current_hash(path) == digest
+                           for path in paths[module_id])
+                       for module_id, digest in dependencies.items())
+
+        restored = 0
+        for module_id, path in modules:
+            meta, data = [os.path.join(self.cache_dir, entry)
+                          for entry in _entry_names(module_id, path)]
+            digest = current_hash(path)
+            if digest is None or os.path.exists(meta):
+                continue
+            directory = self._object(module_id, digest)
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if not name.endswith(DEPS_SUFFIX):
+                    continue
+                stored = os.path.join(directory, name[:-len(DEPS_SUFFIX)])
+                try:
+                    with open(stored + DEPS_SUFFIX) as f:
+                        if not matches(json.load(f)):
+                            continue
+                    _copy([stored + DATA_SUFFIX, stored + META_SUFFIX],
+                          [data, meta])
+                except (IOError, OSError, ValueError, AttributeError):
+                    continue
+                restored += 1
+                break
+        stats.registry.incr('shared_cache_restored', restored)
+        log.info("restored %d mypy cache entries from %s", restored,
+                 self.directory)
+        return restored
+
+    def restore_once(self):
+        with self._lock:
+            if self._restored:
+                return
+            self._restored = True
+            self.restore()
+
+    def export(self, since=0.0):
+        '''
+        Copy the entries of the cache written since the given time into the
+        store; return how many were added.
+        '''
+        exported = 0
+        for directory, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith(META_SUFFIX) or \
+                        filename.startswith('@'):
+                    continue
+                meta = os.path.join(directory, filename)
+                data = meta[:-len(META_SUFFIX)] + DATA_SUFFIX
+                try:
+                    if os.stat(meta).st_mtime < since:
+                        continue
+                    with open(meta) as f:
+                        content = json.load(f)
+                    module_id, path = content['id'], content['path']
+                    # Exported once its dependencies have entries too
+                    dependencies = self._dependency_hashes(content)
+                    if dependencies is None:
+                        continue
+                    stored = os.path.join(
+                        self._object(module_id, content['hash']),
+                        _digest(sorted(dependencies.items()))[:16])
+                    if os.path.exists(stored + DEPS_SUFFIX):
+                        continue
+                    # The dependencies last: they complete a stored entry
+                    _copy([data, meta],
+                          [stored + DATA_SUFFIX, stored + META_SUFFIX])
+                    _write_json(stored + DEPS_SUFFIX, dependencies)
+                    self._write_index(module_id, self._path_key(path))
+                except (IOError, OSError, ValueError, KeyError, TypeError):
+                    continue
+                exported += 1
+        stats.registry.incr('shared_cache_exported', exported)
+        return exported
+
+    def export_later(self):
+        '''
+        Export what the last checks added to the cache in the background,
+        at most every EXPORT_INTERVAL seconds.
+        '''
+        with self._lock:
+            now = timeit.default_timer()
+            if self._exporting or now - self._exported < EXPORT_INTERVAL:
+                return
+            self._exporting = True
+            self._exported = now
+        thread = threading.Thread(target=self._export, name='pyls_mypy-share')
+        thread.daemon = True
+        thread.start()
+
+    def _export(self):
+        try:
+            # A meta written during the export is exported the next time
+            since, self._since = self._since, time.time() - 1
+            self.export(since)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("exporting to %s failed", self.directory)
+        finally:
+            with self._lock:
+                self._exporting = False
+
+
+def get_store(directory, name, cache_dir, root, base, flags=()):
+    '''
+    Return the shared cache for the mypy cache at cache_dir of mypy runs
+    with flags from the current directory.
+    '''
+    key = (directory, name, cache_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SharedCache(directory, name, cache_dir,
+                                               root, base,
+                                               cache_version(flags))
+        return store
@@ -0,0 +1,102 @@
+import contextlib
+import glob
+import logging
+import os
+import sqlite3
+
+from pyls_mypy import stats
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Vacuum a cache database once this share of its pages is unused
+DEFAULT_VACUUM_RATIO = 0.25
+LOCK_FILE = 'pyls_mypy.lock'
+DB_NAME = 'cache.db'
+
+
+def databases(cache_dir):
+    '''
+    Return the SQLite databases of the mypy cache at cache_dir, one per
+    Python version checked against.
+    '''
+    return sorted(glob.glob(os.path.join(cache_dir, '*', DB_NAME)))
+
+
+@contextlib.contextmanager
+def locked(cache_dir, exclusive=False, blocking=True):
+    '''
+    Hold a lock on the mypy cache at cache_dir: shared by the pyls instances
+    running mypy with it, or exclusive for maintenance. Yields whether the
+    lock is held, which without blocking is not the case when another
+    instance holds a conflicting lock.
+
+    Where file locks are not available, only shared locks are "held".
+    '''
+    if fcntl is None:
+        yield not exclusive
+        return
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        lock_file = open(os.path.join(cache_dir, LOCK_FILE), 'a')
+    except (IOError, OSError):
+        log.exception("cannot lock mypy cache %s", cache_dir)
+        yield not exclusive
+        return
+    with lock_file:
+        flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(lock_file, flags if blocking else
+                        flags | fcntl.LOCK_NB)
+            held = True
+        except (IOError, OSError):
+            held = False
+        try:
+            yield held
+        finally:
+            if held:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _vacuum(path, ratio):
+    # No waiting: mypy may be writing to the database
+    conn = sqlite3.connect(path, timeout=0)
+    try:
+        pages = conn.execute('PRAGMA page_count').fetchone()[0]
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if not pages or free < pages * ratio:
+            return False
+        conn.execute('VACUUM')
+        return True
+    finally:
+        conn.close()
+
+
+def vacuum(cache_dir, ratio=DEFAULT_VACUUM_RATIO):
+    '''
+    Compact the SQLite databases of the mypy cache at cache_dir that have
+    at least ratio of their pages unused, unless another pyls instance is
+    using the cache. Return the number of bytes reclaimed.
+    '''
+    reclaimed = 0
+    with locked(cache_dir, exclusive=True, blocking=False) as held:
+        if not held:
+            log.debug("mypy cache %s is in use, not vacuuming it", cache_dir)
+            return 0
+        for path in databases(cache_dir):
+            try:
+                size = os.path.getsize(path)
+                if _vacuum(path, ratio):
+                    reclaimed += size - os.path.getsize(path)
+                    stats.registry.incr('sqlite_vacuums')
+            except (sqlite3.Error, OSError) as e:
+                log.warning("cannot vacuum mypy cache %s: %s", path, e)
+    if reclaimed:
+        log.info("vacuuming mypy cache %s reclaimed %d bytes", cache_dir,
+                 reclaimed)
+    return reclaimed
@@ -0,0 +1,96 @@
+import collections
+import copy
+import difflib
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# Files whose last diagnostics are kept to show until they are saved again
+DEFAULT_SAVED_RESULTS = 1000
+
+
+def is_stale(snapshot, document):
+    '''
+    Return whether document moved on from the version snapshot was taken of.
+
+    A document that was edited back to the checked text (e.g. by undo) is
+    not stale, even though its version changed.
+    '''
+    if document is None or document is snapshot:
+        return False
+    if document.version == snapshot.version:
+        return False
+    return document.source != snapshot.source
+
+
+def _line_map(old_source, new_source):
+    old_lines = old_source.splitlines()
+    new_lines = new_source.splitlines()
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines,
+                                      autojunk=False)
+    line_map = {}
+    for tag, i1, i2, j1, _ in matcher.get_opcodes():
+        if tag == 'equal':
+            for offset in range(i2 - i1):
+                line_map[i1 + offset] = j1 + offset
+    return line_map
+
+
+def remap(diagnostics, old_source, new_source):
+    '''
+    Move diagnostics computed against old_source to the same lines in
+    new_source; diagnostics on lines that were edited are dropped.
+    '''
+    line_map = _line_map(old_source, new_source)
+    remapped = []
+    for diag in diagnostics:
+        start = diag['range']['start']
+        end = diag['range']['end']
+        if start['line'] not in line_map or end['line'] not in line_map:
+            continue
+        diag['range'] = {
+            'start': dict(start, line=line_map[start['line']]),
+            'end': dict(end, line=line_map[end['line']]),
+        }
+        remapped.append(diag)
+    log.debug("remapped %d of %d stale diagnostics", len(remapped),
+              len(diagnostics))
+    return remapped
+
+
+class SavedResults(object):
+    '''
+    The diagnostics of the last check of each saved file, with the text they
+    were computed against, for backends that only check files on disk.
+    '''
+
+    def __init__(self, maxsize=DEFAULT_SAVED_RESULTS):
+        self.maxsize = maxsize
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, path, source, diagnostics):
+        with self._lock:
+            self._results[path] = (source, copy.deepcopy(diagnostics))
+            self._results.move_to_end(path)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def get(self, path, source):
+        '''
+        Return the last diagnostics of path moved to where their lines are in
+        source, or no diagnostics if path was not checked.
+        '''
+        with self._lock:
+            result = self._results.get(path)
+        if result is None:
+            return []
+        return remap(copy.deepcopy(result[1]), result[0], source)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+saved_results = SavedResults()
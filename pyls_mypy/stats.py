@@ -0,0 +1,75 @@
+import collections
+import contextlib
+import threading
+import timeit
+
+
+class Timings(object):
+    '''
+    The time spent in each stage of a single lint, in seconds.
+    '''
+
+    def __init__(self):
+        self.stages = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            self.stages[name] = (self.stages.get(name, 0.0) +
+                                 timeit.default_timer() - start)
+
+    @property
+    def total(self):
+        return sum(self.stages.values())
+
+    def __str__(self):
+        return ', '.join('%s %.3fs' % stage for stage in self.stages.items())
+
+
+class Registry(object):
+    '''
+    Counters and per-stage timing aggregates for the whole pyls session.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = collections.Counter()
+            self._stages = {}
+
+    def incr(self, name, count=1):
+        with self._lock:
+            self._counters[name] += count
+
+    def record(self, timings):
+        '''
+        Add the stages of one lint to the aggregates.
+        '''
+        with self._lock:
+            for name, seconds in timings.stages.items():
+                stage = self._stages.setdefault(
+                    name, {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+                stage['count'] += 1
+                stage['total'] += seconds
+                stage['max'] = max(stage['max'], seconds)
+                stage['last'] = seconds
+
+    def snapshot(self):
+        '''
+        Return a copy of all counters and stage aggregates.
+        '''
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'stages': {name: dict(stage)
+                           for name, stage in self._stages.items()},
+            }
+
+
+registry = Registry()
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from pyls_mypy import cachedir, stats
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 5000
+# Drop the least recently used entries past the maximum every so many writes
+PRUNE_EVERY = 100
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def default_path():
+    return os.path.join(cachedir.user_cache_dir(), 'diagnostics.db')
+
+
+class DiagnosticsStore(object):
+    '''
+    The last diagnostics of each file, kept on disk across pyls sessions in
+    a SQLite database at path, along with the cache key of the check they
+    came from.
+
+    A stored entry is only served once per session: it stands in for the
+    check that revalidates it.
+    '''
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._served = set()
+        self._written = {}
+        self._writes = 0
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            # Several pyls instances may share the database
+            self._conn = sqlite3.connect(self.path, timeout=1,
+                                         check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS diagnostics ('
+                'path TEXT PRIMARY KEY, key TEXT NOT NULL, '
+                'diagnostics BLOB NOT NULL, used REAL NOT NULL)')
+            self._conn.commit()
+        return self._conn
+
+    def take(self, path, key):
+        '''
+        Return the stored diagnostics of the file at path if they came from
+        a check with the given key and were not served yet, or None.
+        '''
+        with self._lock:
+            if (path, key) in self._served:
+                return None
+            self._served.add((path, key))
+            try:
+                row = self._connect().execute(
+                    'SELECT diagnostics FROM diagnostics '
+                    'WHERE path = ? AND key = ?', (path, key)).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                log.warning("cannot read diagnostics store %s: %s",
+                            self.path, e)
+                return None
+        if row is None:
+            stats.registry.incr('store_misses')
+            return None
+        stats.registry.incr('store_hits')
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, path, key, diagnostics):
+        '''
+        Store the diagnostics of a check of the file at path with the given
+        key, replacing the earlier ones.
+        '''
+        with self._lock:
+            # Results served from memory are put again and again
+            if self._written.get(path) == key:
+                return
+            data = zlib.compress(json.dumps(diagnostics).encode('utf-8'))
+            try:
+                conn = self._connect()
+                conn.execute('INSERT OR REPLACE INTO diagnostics '
+                             'VALUES (?, ?, ?, ?)',
+                             (path, key, data, time.time()))
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune(conn)
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                log.warning("cannot write diagnostics store %s: %s",
+                            self.path, e)
+                return
+            self._written[path] = key
+
+    def _prune(self, conn):
+        conn.execute('DELETE FROM diagnostics WHERE path NOT IN '
+                     '(SELECT path FROM diagnostics ORDER BY used DESC '
+                     'LIMIT ?)', (self.max_entries,))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def get_store(path, max_entries=DEFAULT_MAX_ENTRIES):
+    '''
+    Return the diagnostics store at path.
+    '''
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = DiagnosticsStore(path, max_entries)
+        store.max_entries = max_entries
+        return store
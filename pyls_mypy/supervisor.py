@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+
+from pyls_mypy import stats
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_CHECKS = 1000
+DEFAULT_MAX_RSS_MB = 2048
+
+
+def rss_bytes(pid=None):
+    '''
+    Return the resident memory of a process (this one by default) in bytes,
+    or None if it cannot be measured on this platform.
+    '''
+    pid = pid or os.getpid()
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open('/proc/%d/statm' % pid) as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class Supervisor(object):
+    '''
+    Tracks the checks run by one long-lived mypy worker (the dmypy daemon or
+    the fine-grained engine) and tells when it should be recycled, because it
+    ran too many checks or grew too large.
+
+    The memory limit applies to what the worker grew by since it was last
+    warmed again after a recycle: a process does not always give memory
+    back, and a worker that starts out large would otherwise be recycled
+    over and over.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.max_checks = DEFAULT_MAX_CHECKS
+        self.max_rss_mb = DEFAULT_MAX_RSS_MB
+        self.checks = 0
+        self.rss = None
+        # The memory of the worker right after it was last warmed again
+        self.baseline = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_checks=DEFAULT_MAX_CHECKS,
+                  max_rss_mb=DEFAULT_MAX_RSS_MB):
+        '''
+        Set the thresholds; 0 disables a threshold.
+        '''
+        self.max_checks = max_checks
+        self.max_rss_mb = max_rss_mb
+
+    def checked(self, pid=None, rewarm=False):
+        '''
+        Record a check by the worker process pid and return whether the
+        worker should now be recycled. The check that warms a worker again
+        after a recycle never recycles it, and sets the memory it may grow
+        from.
+        '''
+        with self._lock:
+            self.checks += 1
+            self.rss = rss_bytes(pid) if pid else None
+            if rewarm:
+                self.baseline = self.rss
+                return False
+            too_many = self.max_checks and self.checks >= self.max_checks
+            too_large = (self.max_rss_mb and self.rss is not None and
+                         self.rss - (self.baseline or 0) >=
+                         self.max_rss_mb * 1024 * 1024)
+        if too_many or too_large:
+            log.info("recycling %s after %d checks at %s MiB", self.name,
+                     self.checks,
+                     self.rss // (1024 * 1024) if self.rss else 'unknown')
+            stats.registry.incr('recycles')
+            return True
+        return False
+
+    def rebase(self, pid=None):
+        '''
+        Set the memory the worker process pid may grow from.
+        '''
+        with self._lock:
+            self.baseline = rss_bytes(pid) if pid else None
+
+    def reset(self):
+        with self._lock:
+            self.checks = 0
+            self.rss = None
+
+    def status(self):
+        with self._lock:
+            return {'name': self.name, 'checks': self.checks,
+                    'rss': self.rss, 'baseline': self.baseline}
@@ -0,0 +1,154 @@
+import atexit
+import contextlib
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import timeit
+
+from pyls_mypy import stats
+
+log = logging.getLogger(__name__)
+
+# Windows' BELOW_NORMAL_PRIORITY_CLASS
+_BELOW_NORMAL_PRIORITY = 0x4000
+_NICENESS = 10
+
+_lock = threading.Lock()
+_running = set()
+_foreground = 0
+_last_foreground = 0.0
+
+
+def _lower_priority():
+    os.nice(_NICENESS)
+
+
+class Warmup(object):
+    '''
+    A low-priority mypy run over workspace roots in a separate process, to
+    fill mypy's incremental cache before the first document is linted.
+
+    While pyls_lint runs a check in the foreground, the process is
+    suspended (where the platform allows), so that it never competes with
+    the checks that somebody is waiting for.
+
+    A warm-up given a lock, a context manager, holds it while it runs: it
+    holds something that checks need, e.g. the write transaction of a SQLite
+    cache, so that a suspended run would keep them waiting. Such a warm-up
+    is stopped by the first check instead, which then waits for the lock
+    only until the process is gone.
+    '''
+
+    def __init__(self, args, roots, cwd, lock=None):
+        self.args = list(args)
+        self.roots = list(roots)
+        self.cwd = cwd
+        self.lock = lock
+        self._held = contextlib.ExitStack()
+        self._proc = None
+        self._paused = False
+
+    def start(self):
+        cmd = [sys.executable, '-m', 'mypy'] + self.args + self.roots
+        kwargs = {}
+        if os.name == 'posix':
+            kwargs['preexec_fn'] = _lower_priority
+        elif os.name == 'nt':
+            kwargs['creationflags'] = _BELOW_NORMAL_PRIORITY
+        log.info("warming up mypy cache for %s", self.roots)
+        if self.lock is not None:
+            self._held.enter_context(self.lock)
+        try:
+            self._proc = subprocess.Popen(cmd, cwd=self.cwd,
+                                          stdout=subprocess.DEVNULL,
+                                          stderr=subprocess.DEVNULL, **kwargs)
+        except BaseException:
+            self._held.close()
+            raise
+        with _lock:
+            _running.add(self)
+            if _foreground:
+                self.pause()
+        thread = threading.Thread(target=self._wait, name='pyls_mypy-warmup')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def _wait(self):
+        start = timeit.default_timer()
+        status = self._proc.wait()
+        self._held.close()
+        with _lock:
+            _running.discard(self)
+        stats.registry.incr('warmups')
+        log.info("mypy cache warm-up of %s finished in %.1fs with status %s",
+                 self.roots, timeit.default_timer() - start, status)
+
+    @property
+    def running(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def pause(self):
+        if self.lock is not None:
+            self.cancel()
+            return
+        if self.running and not self._paused and hasattr(signal, 'SIGSTOP'):
+            self._proc.send_signal(signal.SIGSTOP)
+            self._paused = True
+
+    def resume(self):
+        if self.running and self._paused:
+            self._proc.send_signal(signal.SIGCONT)
+        self._paused = False
+
+    def cancel(self):
+        if self.running:
+            log.info("cancelling mypy cache warm-up of %s", self.roots)
+            self._proc.kill()
+            # A stopped process only dies once it is continued
+            self.resume()
+
+
+@contextlib.contextmanager
+def foreground():
+    '''
+    Suspend all warm-ups while in this context, or stop the ones holding a
+    lock.
+    '''
+    global _foreground, _last_foreground  # pylint: disable=global-statement
+    with _lock:
+        _foreground += 1
+        if _foreground == 1:
+            for warmup in _running:
+                warmup.pause()
+    try:
+        yield
+    finally:
+        with _lock:
+            _foreground -= 1
+            if not _foreground:
+                _last_foreground = timeit.default_timer()
+                for warmup in _running:
+                    warmup.resume()
+
+
+def idle_time():
+    '''
+    Return for how many seconds no check has been running in the foreground,
+    or 0 while one is.
+    '''
+    with _lock:
+        if _foreground:
+            return 0.0
+        return timeit.default_timer() - _last_foreground
+
+
+@atexit.register
+def cancel_all():
+    with _lock:
+        warmups = list(_running)
+    for warmup in warmups:
+        warmup.cancel()
@@ -0,0 +1,226 @@
+import atexit
+import logging
+import os
+import threading
+
+from pyls_mypy import project, stats
+
+try:
+    from watchdog import events, observers
+except ImportError:
+    events = observers = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def _is_source(path):
+    return bool(path) and path.endswith(project.SOURCE_EXTENSIONS)
+
+
+def _scan(root):
+    stamps = {}
+    for paths in project.find_modules(root).values():
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamps[path] = (st.st_mtime_ns, st.st_size)
+    return stamps
+
+
+class Watcher(object):
+    '''
+    Keeps the set of Python files under a workspace root that changed or
+    were removed since the changes were last taken, so that mypy does not
+    have to stat every file it knows about to find them.
+
+    Changes come from watchdog (inotify and the like) when it is installed,
+    and from a scan of the tree every poll_interval seconds otherwise.
+    '''
+
+    def __init__(self, root, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._changed = set()
+        self._removed = set()
+        # Until the watcher runs, nothing is known about changes
+        self._known = False
+        self._observer = None
+        self._stop = threading.Event()
+
+    @property
+    def native(self):
+        return self._observer is not None
+
+    def start(self):
+        if observers is not None:
+            try:
+                self._observer = observers.Observer()
+                self._observer.schedule(_Handler(self), self.root,
+                                        recursive=True)
+                self._observer.daemon = True
+                self._observer.start()
+                with self._lock:
+                    self._known = True
+                return self
+            except Exception:  # pylint: disable=broad-except
+                log.exception("cannot watch %s, polling it instead",
+                              self.root)
+                self._observer = None
+        thread = threading.Thread(target=self._poll, name='pyls_mypy-watch')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def _poll(self):
+        stamps = _scan(self.root)
+        with self._lock:
+            self._known = True
+        while not self._stop.wait(self.poll_interval):
+            new_stamps = _scan(self.root)
+            with self._lock:
+                for path, stamp in new_stamps.items():
+                    if stamps.get(path) != stamp:
+                        self._changed.add(path)
+                        self._removed.discard(path)
+                for path in set(stamps) - set(new_stamps):
+                    self._removed.add(path)
+                    self._changed.discard(path)
+            stamps = new_stamps
+
+    def record(self, path, removed=False):
+        if not _is_source(path):
+            return
+        with self._lock:
+            if removed:
+                self._removed.add(path)
+                self._changed.discard(path)
+            else:
+                self._changed.add(path)
+                self._removed.discard(path)
+
+    def overflow(self):
+        '''
+        Forget what is known about changes, e.g. when events were lost.
+        '''
+        with self._lock:
+            self._known = False
+
+    def changes(self):
+        '''
+        Return the sets of paths changed and removed since the last call, or
+        None when they are not known.
+        '''
+        with self._lock:
+            changes = (self._changed, self._removed) if self._known else None
+            self._changed, self._removed = set(), set()
+            if self._observer is not None:
+                # Known again from now on, after an overflow
+                self._known = True
+            return changes
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+
+if events is not None:
+    class _Handler(events.FileSystemEventHandler):
+
+        def __init__(self, watcher):
+            super(_Handler, self).__init__()
+            self.watcher = watcher
+
+        def on_any_event(self, event):
+            if event.is_directory:
+                # Files moved or deleted with their directory get no events
+                # of their own
+                if event.event_type in ('moved', 'deleted'):
+                    self.watcher.overflow()
+                return
+            if event.event_type == 'moved':
+                self.watcher.record(event.src_path, removed=True)
+                self.watcher.record(event.dest_path)
+            else:
+                self.watcher.record(event.src_path,
+                                    removed=event.event_type == 'deleted')
+
+
+def get_watcher(root, poll_interval=DEFAULT_POLL_INTERVAL):
+    '''
+    Return the running watcher of a workspace root.
+    '''
+    with _watchers_lock:
+        watcher = _watchers.get(root)
+        if watcher is None:
+            watcher = _watchers[root] = Watcher(root, poll_interval).start()
+        return watcher
+
+
+def recheck_lists(changes, files, sources):
+    '''
+    Return the (update, remove) lists telling mypy what changed among the
+    sources of its build since its last check, given the changes seen by a
+    watcher; or None if mypy has to find out by itself.
+
+    The files being checked are always updated, since the event telling
+    that a file was just saved may not have arrived yet.
+    '''
+    if changes is None:
+        return None
+    changed, removed = changes
+    remove = sorted(path for path in removed if path in sources)
+    update = [path for path in files if path not in remove]
+    update.extend(sorted(path for path in changed
+                         if path in sources and path not in update))
+    return update, remove
+
+
+def follows_imports(flags):
+    '''
+    Return whether mypy run with flags analyzes the modules that the files
+    it checks import, rather than only the files themselves.
+    '''
+    flags = list(flags)
+    if '--follow-imports' in flags:
+        index = flags.index('--follow-imports') + 1
+        return flags[index:index + 1] not in (['skip'], ['error'])
+    return True
+
+
+def plan_recheck(watcher, flags, files, sources):
+    '''
+    Return the (update, remove) lists for a recheck of files by a mypy
+    server running with flags, using the changes seen by watcher; or None
+    if the server has to find the changes by itself.
+
+    mypy only takes these lists when it does not follow imports: otherwise
+    it has to stat every module of its build anyway.
+    '''
+    changes = watcher.changes() if watcher is not None else None
+    lists = None
+    if not follows_imports(flags):
+        lists = recheck_lists(changes, files, sources)
+    if lists is None:
+        stats.registry.incr('full_rescans')
+    else:
+        stats.registry.incr('rescans')
+        stats.registry.incr('files_rescanned', sum(map(len, lists)))
+    return lists
+
+
+@atexit.register
+def stop_all():
+    with _watchers_lock:
+        for watcher in _watchers.values():
+            watcher.stop()
+        _watchers.clear()
@@ -0,0 +1,174 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 0.2
+# How long checks that are due wait for others to be run together with them
+DEFAULT_WINDOW = 0.05
+
+
+class Check(object):
+    '''
+    A check of one document, identified by the cache key of what is checked.
+
+    run() returns the diagnostics, publish() is called once they are
+    available through BackgroundChecker.result(). run() can watch the
+    cancel_event to stop early when the check is cancelled.
+
+    Checks with the same batch_key that are due together are run at once,
+    by passing them all to run_batch() of the first one, which returns the
+    diagnostics of each; part holds what run_batch() needs to know about
+    this check.
+    '''
+
+    def __init__(self, uri, key, run, publish, cancel_event=None,
+                 batch_key=None, run_batch=None, part=None):
+        self.uri = uri
+        self.key = key
+        self.run = run
+        self.publish = publish
+        self.cancel_event = cancel_event or threading.Event()
+        self.batch_key = batch_key if run_batch is not None else None
+        self.run_batch = run_batch
+        self.part = part
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class BackgroundChecker(object):
+    '''
+    Runs checks off the pyls request thread, one at a time.
+
+    Each document has at most one pending check: a newer check for the same
+    document cancels the previous one, whether it is still being debounced
+    or already running. Results of cancelled checks are never published.
+
+    Checks of different documents that become due within a short window of
+    each other, or while another check is running, are coalesced into one
+    batch when they have the same batch key.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._checks = {}
+        self._results = {}
+        self._ready = []
+        self._draining = False
+        # mypy redirects sys.stdout while it runs, so checks must not overlap
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def result(self, uri, key):
+        '''
+        Return the diagnostics of the finished check of uri with key, if any.
+        '''
+        with self._lock:
+            result = self._results.get(uri)
+        if result is not None and result[0] == key:
+            return result[1]
+        return None
+
+    def last_result(self, uri):
+        '''
+        Return the diagnostics of the last finished check of uri, if any.
+        '''
+        with self._lock:
+            result = self._results.get(uri)
+        return result[1] if result is not None else None
+
+    def submit(self, check, delay=DEFAULT_DEBOUNCE, window=DEFAULT_WINDOW):
+        '''
+        Run check after delay seconds, unless another check of the same
+        document is submitted in the meantime; then wait window more seconds
+        for other checks to run with it.
+        '''
+        with self._lock:
+            current = self._checks.get(check.uri)
+            if current is not None and current.key == check.key:
+                return current
+            if current is not None:
+                log.debug("superseding check of %s", check.uri)
+                current.cancel()
+            timer = self._timers.pop(check.uri, None)
+            if timer is not None:
+                timer.cancel()
+
+            self._checks[check.uri] = check
+            timer = self._timers[check.uri] = threading.Timer(
+                delay, self._start, (check, window))
+            timer.daemon = True
+            timer.start()
+            return check
+
+    def _start(self, check, window):
+        with self._lock:
+            self._timers.pop(check.uri, None)
+            if check.cancelled:
+                return
+            self._ready.append(check)
+            if self._draining:
+                return
+            self._draining = True
+        timer = threading.Timer(window, self._executor.submit, (self._drain,))
+        timer.daemon = True
+        timer.start()
+
+    def _drain(self):
+        with self._lock:
+            ready, self._ready = self._ready, []
+            self._draining = False
+        batches = {}
+        for check in ready:
+            key = check.batch_key if check.batch_key is not None else check
+            batches.setdefault(key, []).append(check)
+        for checks in batches.values():
+            self._execute(checks)
+
+    def _execute(self, checks):
+        checks = [check for check in checks if not check.cancelled]
+        if not checks:
+            return
+        try:
+            if len(checks) == 1:
+                results = [checks[0].run()]
+            else:
+                log.debug("checking %d documents together", len(checks))
+                results = checks[0].run_batch(checks)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("background check of %s failed",
+                          ', '.join(check.uri for check in checks))
+            results = [None] * len(checks)
+        for check, diagnostics in zip(checks, results):
+            self._finish(check, diagnostics)
+
+    def _finish(self, check, diagnostics):
+        with self._lock:
+            if self._checks.get(check.uri) is check:
+                del self._checks[check.uri]
+            if check.cancelled or diagnostics is None:
+                return
+            self._results[check.uri] = (check.key, diagnostics)
+        check.publish()
+
+    def forget(self, uri):
+        '''
+        Cancel any pending check of uri and drop its results.
+        '''
+        with self._lock:
+            check = self._checks.pop(uri, None)
+            if check is not None:
+                check.cancel()
+            timer = self._timers.pop(uri, None)
+            if timer is not None:
+                timer.cancel()
+            self._results.pop(uri, None)
+
+
+checker = BackgroundChecker()
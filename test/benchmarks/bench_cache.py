@@ -0,0 +1,102 @@
+'''
+Benchmark mypy's two incremental cache formats on synthetic projects of
+different sizes: JSON files (the default) and a single SQLite database
+(the sqlite_cache setting).
+
+For each project size and format this reports the latency of a check with
+an empty cache (cold), of the same check with the cache filled (warm), and
+the number of files and bytes the cache takes on disk.
+
+Run from the repository root with, e.g.:
+
+    python -m test.benchmarks.bench_cache --sizes 100,1000
+
+Results can be written to a JSON file with --json.
+'''
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from pyls_mypy import plugin, report
+
+from test.benchmarks import project
+
+SIZES = [10, 100, 1000]
+FORMATS = {
+    'json': {},
+    'sqlite': {'sqlite_cache': True},
+}
+
+
+def disk_usage(path):
+    '''
+    Return the number of files under path and their total size in bytes.
+    '''
+    files = size = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            files += 1
+            size += os.path.getsize(os.path.join(directory, filename))
+    return files, size
+
+
+def bench_format(name, n_modules):
+    root = tempfile.mkdtemp(prefix='pyls_mypy_bench_')
+    try:
+        module = project.create(root, n_modules)
+        cache_dir = os.path.join(root, '.mypy_cache')
+        args = (plugin._api_flags(FORMATS[name]) +
+                ['--cache-dir', cache_dir, module])
+
+        def check():
+            return report.run(args)
+
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            cold = timeit.timeit(check, number=1)
+            warm = timeit.timeit(check, number=1)
+        finally:
+            os.chdir(cwd)
+        files, size = disk_usage(cache_dir)
+        return {'format': name, 'modules': n_modules, 'cold': cold,
+                'warm': warm, 'cache_files': files, 'cache_bytes': size}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='comma separated project sizes in modules')
+    parser.add_argument('--formats', default=','.join(sorted(FORMATS)),
+                        help='comma separated cache formats out of %s'
+                        % ', '.join(sorted(FORMATS)))
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    # Keep importing mypy out of the first measurement
+    report.preload()
+    results = []
+    print('%-8s %8s %10s %10s %8s %12s' % (
+        'format', 'modules', 'cold (s)', 'warm (s)', 'files', 'bytes'))
+    for n_modules in [int(size) for size in args.sizes.split(',')]:
+        for name in args.formats.split(','):
+            result = bench_format(name, n_modules)
+            results.append(result)
+            print('%-8s %8d %10.3f %10.3f %8d %12d' % (
+                name, n_modules, result['cold'], result['warm'],
+                result['cache_files'], result['cache_bytes']))
+            sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''
+Benchmark converting mypy errors to diagnostics, one document split per
+diagnostic (parse_line) against one line index per lint
+(errors_to_diagnostics).
+
+Run from the repository root with:
+
+    python -m test.benchmarks.bench_conversion
+'''
+import timeit
+
+from pyls.workspace import Document
+from pyls_mypy import plugin, report
+
+DIAGNOSTIC_COUNTS = [10, 100, 500]
+DOCUMENT_LINES = [100, 1000, 10000]
+REPEAT = 3
+
+
+def _document(n_lines):
+    return Document('file:///bench/module.py',
+                    'some_variable = undefined_name + 1\n' * n_lines)
+
+
+def _report(document, n_diagnostics):
+    n_lines = len(document.lines)
+    return ['module.py:%d:17: error: Name "undefined_name" is not defined'
+            % (1 + i * n_lines // n_diagnostics)
+            for i in range(n_diagnostics)]
+
+
+def _time(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT))
+
+
+def main():
+    print('%8s %8s %14s %14s' % ('lines', 'diags', 'per line (ms)',
+                                 'batch (ms)'))
+    for n_lines in DOCUMENT_LINES:
+        document = _document(n_lines)
+        for n_diagnostics in DIAGNOSTIC_COUNTS:
+            text = _report(document, n_diagnostics)
+            errors = [report.parse_error_line(line) for line in text]
+            per_line = _time(
+                lambda: [plugin.parse_line(line, document) for line in text])
+            batch = _time(
+                lambda: plugin.errors_to_diagnostics(errors, document))
+            print('%8d %8d %14.2f %14.2f' % (n_lines, n_diagnostics,
+                                             per_line * 1000, batch * 1000))
+
+
+if __name__ == '__main__':
+    main()
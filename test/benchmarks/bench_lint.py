@@ -0,0 +1,165 @@
+'''
+Benchmark the pyls_lint pipeline on synthetic projects of different sizes,
+for each way of running mypy:
+
+ - live: live_mode with the api backend (unsaved buffer, shadow file)
+ - saved: live_mode off, checking the saved file with the api backend
+ - dmypy: the mypy daemon backend
+ - fine_grained: the in-process fine-grained engine backend
+ - forkserver: live_mode with checks forked from a preloaded mypy process
+
+For each project size and mode this reports the latency of the first (cold)
+lint, of a lint after an edit (warm), and the resident memory of the process
+running mypy afterwards. parse_line throughput is reported once at the end.
+
+Run from the repository root with, e.g.:
+
+    python -m test.benchmarks.bench_lint --sizes 10,100 --modes live,dmypy
+
+Results can be written to a JSON file with --json to compare mypy versions
+or plugin changes.
+'''
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from pyls.workspace import Document
+from pyls_mypy import daemon, engine, plugin
+
+from test.benchmarks import project
+
+SIZES = [10, 100, 1000]
+MODES = {
+    'live': ({'live_mode': True}, False),
+    'saved': ({'live_mode': False}, True),
+    'dmypy': ({'backend': 'dmypy'}, True),
+    'fine_grained': ({'backend': 'fine_grained'}, True),
+    'forkserver': ({'backend': 'forkserver'}, False),
+}
+PARSE_LINE = 'pkg/mod9.py:12:17: error: Unsupported operand types  [operator]'
+
+
+class Config(object):
+    def __init__(self, settings):
+        self.settings = dict(settings, cache_size=0)
+
+    def plugin_settings(self, plugin, document_path=None):
+        return self.settings
+
+
+class Workspace(object):
+    def __init__(self, root_path):
+        self.root_path = root_path
+        # The benchmarked document is the only one, and is not open
+        self.documents = {}
+
+
+def rss_kb(pid=None):
+    '''
+    Return the resident set size of a process in KiB, or None where /proc is
+    not available.
+    '''
+    path = '/proc/%s/status' % (pid or 'self')
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def _daemon_rss_kb(root):
+    status_file = daemon.Daemon(root, []).status_file
+    try:
+        with open(status_file) as f:
+            return rss_kb(json.load(f)['pid'])
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+
+def _timed(func):
+    start = timeit.default_timer()
+    result = func()
+    return timeit.default_timer() - start, result
+
+
+def bench_mode(mode, n_modules):
+    settings, is_saved = MODES[mode]
+    root = tempfile.mkdtemp(prefix='pyls_mypy_bench_')
+    cwd = os.getcwd()
+    try:
+        path = project.create(root, n_modules)
+        os.chdir(root)
+        config, workspace = Config(settings), Workspace(root)
+        with open(path) as f:
+            source = f.read()
+        document = Document('file://' + path, source)
+
+        cold, _ = _timed(
+            lambda: plugin.pyls_lint(config, workspace, document, is_saved))
+
+        source += project.TYPE_ERROR
+        document = Document('file://' + path, source)
+        if is_saved:
+            with open(path, 'w') as f:
+                f.write(source)
+        warm, diagnostics = _timed(
+            lambda: plugin.pyls_lint(config, workspace, document, is_saved))
+
+        rss = _daemon_rss_kb(root) if mode == 'dmypy' else rss_kb()
+        return {'mode': mode, 'modules': n_modules, 'cold': cold,
+                'warm': warm, 'rss_kb': rss, 'diagnostics': len(diagnostics)}
+    finally:
+        os.chdir(cwd)
+        daemon.stop_all()
+        engine.get_engine(root, []).stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_parse_line(number=100000):
+    seconds = min(timeit.repeat(lambda: plugin.parse_line(PARSE_LINE),
+                                number=number, repeat=3))
+    return number / seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='comma separated project sizes in modules')
+    parser.add_argument('--modes', default=','.join(sorted(MODES)),
+                        help='comma separated modes out of %s'
+                        % ', '.join(sorted(MODES)))
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    print('%-14s %8s %10s %10s %10s %6s' % (
+        'mode', 'modules', 'cold (s)', 'warm (s)', 'RSS (MiB)', 'diags'))
+    for n_modules in [int(size) for size in args.sizes.split(',')]:
+        for mode in args.modes.split(','):
+            result = bench_mode(mode, n_modules)
+            results.append(result)
+            rss = result['rss_kb']
+            print('%-14s %8d %10.3f %10.3f %10s %6d' % (
+                mode, n_modules, result['cold'], result['warm'],
+                '%.1f' % (rss / 1024.0) if rss else '-',
+                result['diagnostics']))
+            sys.stdout.flush()
+
+    lines_per_second = bench_parse_line()
+    print('parse_line: %.0f lines/s' % lines_per_second)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'lint': results, 'parse_line': lines_per_second}, f,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
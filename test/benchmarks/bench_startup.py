@@ -0,0 +1,40 @@
+'''
+Benchmark how long pyls spends loading this plugin at startup, by importing
+pyls_mypy.plugin in fresh interpreters.
+
+"lazy" is what pyls pays now: mypy is only imported on the first lint.
+"eager" also imports mypy, which is what every editor launch paid when the
+plugin imported mypy at module level.
+
+Run from the repository root with:
+
+    python -m test.benchmarks.bench_startup
+'''
+import subprocess
+import sys
+import timeit
+
+REPEAT = 5
+STATEMENTS = {
+    'baseline': 'import pyls',
+    'lazy': 'import pyls_mypy.plugin',
+    'eager': 'import pyls_mypy.plugin; pyls_mypy.report.preload()',
+}
+
+
+def time_import(statement, repeat=REPEAT):
+    '''
+    Return the best wall time of running statement in a new interpreter.
+    '''
+    def run():
+        subprocess.check_call([sys.executable, '-c', statement])
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+
+def main():
+    for name in ('baseline', 'lazy', 'eager'):
+        print('%-10s %8.1f ms' % (name, time_import(STATEMENTS[name]) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+'''
+Synthetic projects for the benchmarks: a package of modules importing each
+other as a binary tree, so that checking the last module follows imports
+through a good part of the project.
+'''
+import os
+
+MODULE_TEMPLATE = '''\
+{imports}
+
+class Thing{n}(object):
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    def double(self) -> int:
+        return self.value * 2
+
+
+def compute{n}(value: int) -> int:
+    return {call} + Thing{n}(value).double()
+'''
+
+# Appended to the checked module to give mypy something to report
+TYPE_ERROR = 'broken: int = compute0(1) + "one"\n'
+
+
+def module_name(n):
+    return 'pkg.mod%d' % n
+
+
+def module_source(n):
+    if n == 0:
+        return MODULE_TEMPLATE.format(imports='', n=n, call='value')
+    parent = (n - 1) // 2
+    return MODULE_TEMPLATE.format(
+        imports='from pkg.mod%d import compute%d' % (parent, parent),
+        n=n, call='compute%d(value)' % parent)
+
+
+def create(root, n_modules):
+    '''
+    Write a project of n_modules modules under root and return the path of
+    the module at the bottom of the import tree.
+    '''
+    package = os.path.join(root, 'pkg')
+    os.makedirs(package)
+    with open(os.path.join(package, '__init__.py'), 'w') as f:
+        f.write('')
+    for n in range(n_modules):
+        with open(os.path.join(package, 'mod%d.py' % n), 'w') as f:
+            f.write(module_source(n))
+    return os.path.join(package, 'mod%d.py' % (n_modules - 1))
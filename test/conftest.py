@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from pyls.workspace import Document
+from pyls_mypy import plugin
+
+
+class FakePluginManager(object):
+    def subset_hook_caller(self, name, remove_plugins):
+        def hook(**kwargs):
+            return [plugin.pyls_lint(**kwargs)]
+        return hook
+
+
+class FakeConfig(object):
+    plugin_manager = FakePluginManager()
+    disabled_plugins = []
+
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+
+    def plugin_settings(self, plugin, document_path=None):
+        return self.settings
+
+
+class FakeWorkspace(object):
+    def __init__(self, root_path=None, documents=()):
+        self.root_path = root_path
+        self.documents = {doc.uri: doc for doc in documents}
+        self.published = {}
+        self.messages = []
+        self.done = threading.Event()
+
+    def get_document(self, doc_uri):
+        return self.documents.get(doc_uri) or Document(doc_uri)
+
+    def publish_diagnostics(self, doc_uri, diagnostics):
+        self.published[doc_uri] = diagnostics
+        self.done.set()
+
+    def show_message(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def fake_config():
+    '''
+    Return a factory of pyls configs with the given pyls_mypy settings.
+    '''
+    return FakeConfig
+
+
+@pytest.fixture
+def fake_workspace():
+    '''
+    Return a factory of pyls workspaces at a root holding some documents,
+    which record what is published to them.
+    '''
+    return FakeWorkspace
@@ -0,0 +1,151 @@
+import threading
+import time
+
+from pyls.workspace import Document
+from pyls_mypy import cache, plugin
+
+DOC_URI = __file__
+DOC_TYPE_ERR = """{}.append(3)
+"""
+
+
+def test_lru_eviction():
+    lru = cache.DiagnosticsCache(maxsize=2)
+    lru.put('a', [1])
+    lru.put('b', [2])
+    assert lru.get('a') == [1]
+    lru.put('c', [3])
+
+    assert lru.get('b') is None
+    assert lru.get('a') == [1]
+    assert lru.get('c') == [3]
+    assert (lru.hits, lru.misses) == (3, 1)
+
+
+def test_cached_diagnostics_are_copies():
+    lru = cache.DiagnosticsCache()
+    lru.put('a', [{'message': 'msg'}])
+    lru.get('a')[0]['message'] = 'changed'
+    assert lru.get('a') == [{'message': 'msg'}]
+
+
+def test_key_changes_with_config(tmpdir):
+    doc = Document(DOC_URI, DOC_TYPE_ERR)
+    key = cache.cache_key('api', ['--strict'], doc, str(tmpdir))
+    assert key == cache.cache_key('api', ['--strict'], doc, str(tmpdir))
+    assert key != cache.cache_key('api', [], doc, str(tmpdir))
+
+    tmpdir.join('mypy.ini').write('[mypy]\n')
+    assert key != cache.cache_key('api', ['--strict'], doc, str(tmpdir))
+
+
+def test_key_follows_imported_modules(tmpdir, fake_config):
+    helper = tmpdir.join('helper.py')
+    helper.write('def answer() -> int:\n    return 42\n')
+    module = tmpdir.join('module.py')
+    module.write('from helper import answer\nanswer() + ""\n')
+    doc = Document('file://' + str(module), module.read())
+    cache.diagnostics_cache.clear()
+    with tmpdir.as_cwd():
+        assert len(plugin.pyls_lint(fake_config(), None, doc, True)) == 1
+        helper.write('def answer() -> str:\n    return "42"\n')
+        assert plugin.pyls_lint(fake_config(), None, doc, True) == []
+    assert cache.diagnostics_cache.misses == 2
+
+
+def test_plugin_uses_cache(monkeypatch, fake_config):
+    cache.diagnostics_cache.clear()
+    doc = Document(DOC_URI, DOC_TYPE_ERR)
+    diags = plugin.pyls_lint(fake_config(), None, doc, is_saved=False)
+    assert cache.diagnostics_cache.misses == 1
+
+    def fail(*args):
+        raise AssertionError('mypy should not run')
+
+    monkeypatch.setattr(plugin.report, 'run', fail)
+    assert plugin.pyls_lint(fake_config(), None, doc, is_saved=False) == diags
+    assert cache.diagnostics_cache.hits == 1
+
+
+def test_single_flight_shares_run_in_flight():
+    flight = cache.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def run():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return len(runs)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(
+        flight.do('key', run)))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(
+        flight.do('key', run)))
+    follower.start()
+    # Give the follower time to find the run in flight
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == [1, 1]
+    assert runs == [1]
+    assert len(flight) == 0
+    # Runs that do not overlap are not shared
+    assert flight.do('key', run) == 2
+
+
+def test_single_flight_does_not_share_cancelled_run():
+    flight = cache.SingleFlight()
+    cancel = threading.Event()
+    started, release = threading.Event(), threading.Event()
+
+    def cancelled_run():
+        started.set()
+        release.wait(5)
+        cancel.set()
+        return 'cancelled'
+
+    leader = threading.Thread(
+        target=lambda: flight.do('key', cancelled_run, cancel))
+    leader.start()
+    assert started.wait(5)
+    results = []
+    follower = threading.Thread(target=lambda: results.append(
+        flight.do('key', lambda: 'own')))
+    follower.start()
+    # Give the follower time to find the run in flight
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ['own']
+
+
+def test_single_flight_does_not_share_failed_run():
+    flight = cache.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def failed_run():
+        started.set()
+        release.wait(5)
+        return [], 'mypy check timed out', 2
+
+    leader = threading.Thread(target=lambda: flight.do(
+        'key', failed_run, ok=lambda result: result[2] != 2))
+    leader.start()
+    assert started.wait(5)
+    results = []
+    follower = threading.Thread(target=lambda: results.append(
+        flight.do('key', lambda: ([], '', 0))))
+    follower.start()
+    # Give the follower time to find the run in flight
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == [([], '', 0)]
@@ -0,0 +1,73 @@
+import os
+
+from pyls_mypy import cachedir, plugin
+
+
+def _checkout(root, head):
+    git_dir = root.join('.git')
+    git_dir.ensure(dir=True)
+    git_dir.join('HEAD').write(head + '\n')
+
+
+def test_git_head(tmpdir):
+    _checkout(tmpdir, 'ref: refs/heads/main')
+    sub = tmpdir.join('sub').ensure(dir=True)
+    assert cachedir.git_head(str(sub)) == 'refs/heads/main'
+
+    tmpdir.join('.git', 'HEAD').write('0123abcd\n')
+    assert cachedir.git_head(str(sub)) == '0123abcd'
+
+
+def test_git_head_of_worktree(tmpdir):
+    worktree_git = tmpdir.join('repo', '.git', 'worktrees', 'feature')
+    worktree_git.ensure(dir=True)
+    worktree_git.join('HEAD').write('ref: refs/heads/feature\n')
+    worktree = tmpdir.join('feature').ensure(dir=True)
+    worktree.join('.git').write('gitdir: ../repo/.git/worktrees/feature\n')
+    assert cachedir.git_head(str(worktree)) == 'refs/heads/feature'
+
+
+def test_no_cache_dir_outside_git(tmpdir):
+    assert cachedir.git_head(str(tmpdir)) is None
+    assert cachedir.cache_dir(str(tmpdir)) is None
+
+
+def test_slot_name():
+    assert cachedir.slot_name('refs/heads/fix/bug').startswith('fix_bug-')
+    assert cachedir.slot_name('refs/heads/a') != cachedir.slot_name('a')
+
+
+def test_cache_dirs_are_evicted(tmpdir):
+    root = str(tmpdir)
+    dirs = []
+    for i, branch in enumerate(['one', 'two', 'one', 'three']):
+        _checkout(tmpdir, 'ref: refs/heads/' + branch)
+        dirs.append(cachedir.cache_dir(root, slots=2))
+        # Make the order of use visible despite coarse mtimes
+        stamp = os.path.join(dirs[-1], cachedir.STAMP)
+        os.utime(stamp, (1000 + i, 1000 + i))
+
+    assert dirs[0] == dirs[2] != dirs[1]
+    base = os.path.join(root, cachedir.CACHE_ROOT)
+    assert sorted(os.listdir(base)) == sorted(
+        os.path.basename(path) for path in (dirs[0], dirs[3]))
+
+
+def test_api_flags_use_branch_cache(tmpdir):
+    _checkout(tmpdir, 'ref: refs/heads/main')
+    flags = plugin._api_flags({}, str(tmpdir))
+    assert flags[flags.index('--cache-dir') + 1] == \
+        cachedir.cache_dir(str(tmpdir))
+    assert '--cache-dir' not in plugin._api_flags({'branch_caches': False},
+                                                  str(tmpdir))
+
+
+def test_only_current_branch_is_checked_out(tmpdir):
+    _checkout(tmpdir, 'ref: refs/heads/one')
+    one = cachedir.cache_dir(str(tmpdir))
+    _checkout(tmpdir, 'ref: refs/heads/two')
+    two = cachedir.cache_dir(str(tmpdir))
+    with tmpdir.as_cwd():
+        assert sorted(plugin._cache_dirs({}, str(tmpdir))) == \
+            sorted([(one, False), (two, True),
+                    (str(tmpdir.join('.mypy_cache')), True)])
@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from pyls_mypy import cachegc, sqlitecache, warmup
+
+
+def _entry(version_dir, name, source, age_days=0):
+    stem = version_dir.join(name)
+    stem.dirpath().ensure(dir=True)
+    meta = version_dir.join(name + '.meta.json')
+    meta.write(json.dumps({'path': source}))
+    version_dir.join(name + '.data.json').write('{"data": "%s"}' % name)
+    if age_days:
+        used = time.time() - age_days * 24 * 3600
+        os.utime(str(meta), (used, used))
+    return meta
+
+
+def test_collect_files(tmpdir):
+    source = tmpdir.join('kept.py')
+    source.write('')
+    version_dir = tmpdir.join('cache', '3.8')
+    kept = _entry(version_dir, 'kept', 'kept.py')
+    gone = _entry(version_dir, 'pkg/gone', str(tmpdir.join('gone.py')))
+    old = _entry(version_dir, 'old', str(source), age_days=40)
+    internal = version_dir.join('@deps.meta.json')
+    internal.write('{}')
+
+    removed, reclaimed = cachegc.collect(str(tmpdir.join('cache')),
+                                         str(tmpdir), max_age_days=30)
+    assert removed == 2
+    assert reclaimed > 0
+    assert kept.check() and internal.check()
+    assert not gone.check() and not old.check()
+    assert not version_dir.join('pkg', 'gone.data.json').check()
+
+
+def test_collect_database(tmpdir):
+    version_dir = tmpdir.join('cache', '3.8')
+    version_dir.ensure(dir=True)
+    conn = sqlite3.connect(str(version_dir.join(sqlitecache.DB_NAME)))
+    conn.execute('CREATE TABLE files (path TEXT UNIQUE, mtime REAL, '
+                 'data TEXT)')
+    for name, source in (('kept', __file__), ('gone', '/no/such/file.py')):
+        conn.execute('INSERT INTO files VALUES (?, 0, ?)',
+                     (name + '.meta.json', json.dumps({'path': source})))
+        conn.execute('INSERT INTO files VALUES (?, 0, ?)',
+                     (name + '.data.json', '{}'))
+    conn.commit()
+
+    assert cachegc.collect(str(tmpdir.join('cache')), str(tmpdir))[0] == 1
+    assert sorted(row[0] for row in conn.execute('SELECT path FROM files')) \
+        == ['kept.data.json', 'kept.meta.json']
+    conn.close()
+
+
+def test_collect_stops_when_interrupted(tmpdir):
+    version_dir = tmpdir.join('cache', '3.8')
+    gone = _entry(version_dir, 'gone', str(tmpdir.join('gone.py')))
+    assert cachegc.collect(str(tmpdir.join('cache')), str(tmpdir),
+                           interrupted=lambda: True) == (0, 0)
+    assert gone.check()
+
+
+def test_collector_waits_for_idle_time(tmpdir):
+    version_dir = tmpdir.join('cache', '3.8')
+    gone = _entry(version_dir, 'gone', str(tmpdir.join('gone.py')))
+    collector = cachegc.Collector(lambda: [(str(tmpdir.join('cache')), True)],
+                                  str(tmpdir), idle=0.1)
+    checking = threading.Event()
+
+    def check():
+        with warmup.foreground():
+            checking.set()
+            time.sleep(0.5)
+            assert gone.check()
+
+    thread = threading.Thread(target=check)
+    thread.start()
+    assert checking.wait(5)
+    assert collector.run() > 0
+    assert not thread.is_alive()
+    thread.join()
+    assert not gone.check()
+
+
+def test_other_branches_only_age(tmpdir):
+    version_dir = tmpdir.join('cache', '3.8')
+    elsewhere = _entry(version_dir, 'elsewhere', 'elsewhere.py')
+    old = _entry(version_dir, 'old', 'old.py', age_days=40)
+    assert cachegc.collect(str(tmpdir.join('cache')), str(tmpdir),
+                           max_age_days=30, checked_out=False)[0] == 1
+    assert elsewhere.check() and not old.check()
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from pyls import uris
+from pyls.workspace import Document
+from pyls_mypy import cache, crossfile, plugin, report
+
+
+def _error(path, line, message):
+    return report.MypyError(path, line, 1, None, None, 'error', message, None)
+
+
+@pytest.fixture
+def workspace(tmpdir, fake_workspace):
+    tmpdir.join('a.py').write('import b\n')
+    tmpdir.join('b.py').write('x: int = ""\n')
+    crossfile.reset()
+    yield fake_workspace(str(tmpdir))
+    crossfile.reset()
+    cache.diagnostics_cache.clear()
+
+
+def _route(workspace, errors, complete=False):
+    plugin._route_cross_file(None, workspace, {}, workspace.root_path,
+                             complete, errors)
+
+
+def test_closed_file_gets_diagnostics(workspace):
+    _route(workspace, [_error('b.py', 1, 'Incompatible types')])
+
+    b_uri = uris.from_fs_path(os.path.join(workspace.root_path, 'b.py'))
+    diags = workspace.published[b_uri]
+    assert len(diags) == 1
+    assert diags[0]['message'] == 'Incompatible types'
+    assert diags[0]['range']['start'] == {'line': 0, 'character': 0}
+
+
+def test_files_outside_workspace_are_ignored(workspace):
+    _route(workspace, [_error('/usr/lib/other.py', 1, 'Incompatible types'),
+                       _error('../b.py', 1, 'Incompatible types')])
+    assert workspace.published == {}
+
+
+def test_complete_report_clears_fixed_files(workspace):
+    b_uri = uris.from_fs_path(os.path.join(workspace.root_path, 'b.py'))
+    _route(workspace, [_error('b.py', 1, 'Incompatible types')], True)
+    assert workspace.published[b_uri]
+
+    # Only a complete report tells that b.py has no errors any more
+    _route(workspace, [])
+    assert workspace.published[b_uri]
+    _route(workspace, [], True)
+    assert workspace.published[b_uri] == []
+
+
+def test_dirty_open_document_is_left_alone(workspace):
+    b_uri = uris.from_fs_path(os.path.join(workspace.root_path, 'b.py'))
+    workspace.documents[b_uri] = Document(b_uri, 'x: int = 1\n')
+    _route(workspace, [_error('b.py', 1, 'Incompatible types')])
+    assert workspace.published == {}
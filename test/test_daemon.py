@@ -0,0 +1,75 @@
+import pytest
+
+from pyls.workspace import Document
+from pyls_mypy import daemon, plugin
+
+DOC_TYPE_ERR = """{}.append(3)
+"""
+TYPE_ERR_MSG = '"Dict[<nothing>, <nothing>]" has no attribute "append"'
+
+
+@pytest.fixture
+def module(tmpdir):
+    path = tmpdir.join('module.py')
+    path.write(DOC_TYPE_ERR)
+    yield path
+    daemon.stop_all()
+
+
+def test_daemon_check_and_recheck(module):
+    flags = ['--follow-imports', 'normal']
+    dmypy = daemon.get_daemon(str(module.dirpath()), flags)
+    report, _, status = dmypy.check([str(module)])
+    assert status == 1
+    assert TYPE_ERR_MSG in report
+
+    module.write('x = 1\n')
+    report, _, status = dmypy.check([str(module)])
+    assert status == 0
+
+
+def test_daemon_restarts_on_new_flags(module):
+    root = str(module.dirpath())
+    dmypy = daemon.get_daemon(root, [])
+    dmypy.check([str(module)])
+    assert daemon.get_daemon(root, ['--strict']) is dmypy
+    assert dmypy.flags == ['--strict']
+    assert dmypy.check([str(module)])[2] == 1
+
+
+def test_syntax_error_does_not_restart_daemon(module, monkeypatch):
+    dmypy = daemon.get_daemon(str(module.dirpath()), [])
+    starts = []
+    start = dmypy.start
+    monkeypatch.setattr(dmypy, 'start', lambda: starts.append(1) or start())
+    module.write('def (\n')
+    for _ in range(3):
+        report, _, status = dmypy.check([str(module)])
+        assert status == 2
+        assert 'invalid syntax' in report
+    assert starts == [1]
+
+
+def test_daemon_per_pyls_process(module, monkeypatch):
+    root = str(module.dirpath())
+    status_file = daemon.Daemon(root, []).status_file
+    monkeypatch.setattr(daemon.os, 'getpid', lambda: 1)
+    assert daemon.Daemon(root, []).status_file != status_file
+
+
+def test_plugin_dmypy(module, fake_config):
+    doc = Document('file://' + str(module), DOC_TYPE_ERR)
+    config = fake_config({'backend': 'dmypy'})
+    workspace = None
+
+    assert plugin.pyls_lint(config, workspace, doc, is_saved=False) == []
+
+    diags = plugin.pyls_lint(config, workspace, doc, is_saved=True)
+    assert len(diags) == 1
+    assert diags[0]['message'] == TYPE_ERR_MSG
+    assert diags[0]['range']['start'] == {'line': 0, 'character': 0}
+
+    # Unsaved edits show the last result where its lines moved
+    doc = Document('file://' + str(module), 'import os\n' + DOC_TYPE_ERR)
+    diags = plugin.pyls_lint(config, workspace, doc, is_saved=False)
+    assert [diag['range']['start']['line'] for diag in diags] == [1]
@@ -0,0 +1,73 @@
+import pytest
+
+from pyls import uris
+from pyls.workspace import Document
+from pyls_mypy import engine, plugin
+
+DOC_TYPE_ERR = """{}.append(3)
+"""
+TYPE_ERR_MSG = '"Dict[<nothing>, <nothing>]" has no attribute "append"'
+
+
+@pytest.fixture
+def module(tmpdir):
+    path = tmpdir.join('module.py')
+    path.write(DOC_TYPE_ERR)
+    return path
+
+
+def test_engine_keeps_previous_files(module):
+    other = module.dirpath().join('other.py')
+    other.write('y = 1 + ""\n')
+    fine_grained = engine.Engine(str(module.dirpath()), [])
+
+    report, _, status = fine_grained.check([str(module)])
+    assert status == 1
+    assert TYPE_ERR_MSG in report
+
+    report, _, status = fine_grained.check([str(other)])
+    assert TYPE_ERR_MSG in report
+    assert 'Unsupported operand types' in report
+
+    module.write('x = 1\n')
+    report, _, status = fine_grained.check([str(module)])
+    assert TYPE_ERR_MSG not in report
+    assert 'Unsupported operand types' in report
+
+
+def test_engine_invalid_flags(module):
+    fine_grained = engine.Engine(str(module.dirpath()), ['--no-such-flag'])
+    assert fine_grained.check([str(module)])[2] == engine.ENGINE_FAILURE
+
+
+def test_plugin_fine_grained(module, fake_config):
+    doc = Document('file://' + str(module), DOC_TYPE_ERR)
+    config = fake_config({'backend': 'fine_grained'})
+    workspace = None
+
+    assert plugin.pyls_lint(config, workspace, doc, is_saved=False) == []
+
+    diags = plugin.pyls_lint(config, workspace, doc, is_saved=True)
+    assert len(diags) == 1
+    assert diags[0]['message'] == TYPE_ERR_MSG
+
+    # Unsaved edits show the last result where its lines moved
+    doc = Document('file://' + str(module), 'import os\n' + DOC_TYPE_ERR)
+    diags = plugin.pyls_lint(config, workspace, doc, is_saved=False)
+    assert [diag['range']['start']['line'] for diag in diags] == [1]
+
+
+def test_plugin_fine_grained_outside_root(tmpdir, fake_config,
+                                          fake_workspace):
+    # The engine runs in pyls, so mypy reports paths relative to its cwd
+    module = tmpdir.join('ws', 'module.py')
+    module.write('import other\n' + DOC_TYPE_ERR, ensure=True)
+    module.dirpath().join('other.py').write('y: int = ""\n')
+    doc = Document('file://' + str(module), module.read())
+    workspace = fake_workspace(str(module.dirpath()), [doc])
+    config = fake_config({'backend': 'fine_grained'})
+    with tmpdir.as_cwd():
+        diags = plugin.pyls_lint(config, workspace, doc, is_saved=True)
+    assert [diag['message'] for diag in diags] == [TYPE_ERR_MSG]
+    other = uris.from_fs_path(str(module.dirpath().join('other.py')))
+    assert len(workspace.published[other]) == 1
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from pyls.workspace import Document
+from pyls_mypy import forkserver, plugin, stats
+
+DOC_URI = __file__
+DOC_TYPE_ERR = """{}.append(3)
+"""
+TYPE_ERR_MSG = '"Dict[<nothing>, <nothing>]" has no attribute "append"'
+
+pytestmark = pytest.mark.skipif(not forkserver.available(),
+                                reason='needs the forkserver start method')
+
+
+def test_forkserver_run():
+    errors, _, status = forkserver.get_forkserver().run(
+        ['--command', DOC_TYPE_ERR])
+    assert status == 1
+    assert errors[0].message == TYPE_ERR_MSG
+
+
+def test_forkserver_timeout():
+    errors, output, status = forkserver.get_forkserver().run(
+        ['--command', DOC_TYPE_ERR], timeout=0)
+    assert (errors, status) == ([], forkserver.FAILURE)
+    assert 'timed out' in output
+
+
+def test_forkserver_cancel():
+    cancel = threading.Event()
+    cancel.set()
+    errors, output, status = forkserver.get_forkserver().run(
+        ['--command', DOC_TYPE_ERR], cancel=cancel)
+    assert (errors, status) == ([], forkserver.FAILURE)
+    assert 'cancelled' in output
+
+
+def test_api_check_is_cancelled_in_a_child():
+    run = plugin._mypy_runner({})
+    cancel = threading.Event()
+    errors, _, status = run(['--command', DOC_TYPE_ERR], stats.Timings(),
+                            cancel)
+    assert (errors[0].message, status) == (TYPE_ERR_MSG, 1)
+
+    cancel.set()
+    errors, output, status = run(['--command', DOC_TYPE_ERR],
+                                 stats.Timings(), cancel)
+    assert (errors, status) == ([], forkserver.FAILURE)
+    assert 'cancelled' in output
+
+
+def test_plugin_forkserver(fake_config):
+    config = fake_config({'backend': 'forkserver', 'cache_size': 0})
+    doc = Document(DOC_URI, DOC_TYPE_ERR)
+    diags = plugin.pyls_lint(config, None, doc, is_saved=False)
+    assert len(diags) == 1
+    assert diags[0]['message'] == TYPE_ERR_MSG
@@ -1,7 +1,11 @@
+import os
+import subprocess
+import sys
+
 import pytest
 
 from pyls.workspace import Document
-from pyls_mypy import plugin
+from pyls_mypy import lines, plugin, report, shadow
 
 DOC_URI = __file__
 DOC_TYPE_ERR = """{}.append(3)
@@ -15,13 +19,8 @@ TEST_LINE_WITHOUT_LINE = ('test_plugin.py: '
                           'error: "Request" has no attribute "id"')
 
 
-class FakeConfig(object):
-    def plugin_settings(self, plugin, document_path=None):
-        return {}
-
-
-def test_plugin():
-    config = FakeConfig()
+def test_plugin(fake_config):
+    config = fake_config()
     doc = Document(DOC_URI, DOC_TYPE_ERR)
     workspace = None
     diags = plugin.pyls_lint(config, workspace, doc, is_saved=False)
@@ -65,3 +64,104 @@ def test_parse_line_with_context(monkeypatch, word, bounds):
     assert diag['message'] == '"Request" has no attribute "id"'
     assert diag['range']['start'] == {'line': 278, 'character': bounds[0]}
     assert diag['range']['end'] == {'line': 278, 'character': bounds[1]}
+
+
+def test_live_mode_follows_imports(tmpdir, fake_config):
+    tmpdir.join('helper.py').write('def answer() -> int:\n    return 42\n')
+    module = tmpdir.join('module.py')
+    module.write('')
+    doc = Document('file://' + str(module),
+                   'from helper import answer\nanswer() + ""\n')
+    with tmpdir.as_cwd():
+        diags = plugin.pyls_lint(fake_config(), None, doc, is_saved=False)
+
+    assert len(diags) == 1
+    assert 'Unsupported operand types' in diags[0]['message']
+    assert diags[0]['range']['start']['line'] == 1
+
+
+def test_live_mode_sees_unsaved_imports(tmpdir, fake_config, fake_workspace):
+    helper = tmpdir.join('helper.py')
+    helper.write('def answer() -> int:\n    return 42\n')
+    module = tmpdir.join('module.py')
+    module.write('')
+    doc = Document('file://' + str(module),
+                   'from helper import answer\nanswer() + 1\n')
+    helper_doc = Document('file://' + str(helper), helper.read())
+    workspace = fake_workspace(str(tmpdir), [doc, helper_doc])
+
+    with tmpdir.as_cwd():
+        assert plugin.pyls_lint(fake_config(), workspace, doc, False) == []
+        helper_doc.apply_change({'text': 'def answer() -> str:\n'
+                                         '    return "42"\n'})
+        diags = plugin.pyls_lint(fake_config(), workspace, doc, False)
+
+    assert len(diags) == 1
+    assert 'Unsupported operand types' in diags[0]['message']
+
+
+def test_dirty_documents(tmpdir):
+    saved = tmpdir.join('saved.py')
+    saved.write('x = 1\n')
+    edited = tmpdir.join('edited.py')
+    edited.write('x = 1\n')
+    docs = [Document('file://' + str(saved), 'x = 1\n'),
+            Document('file://' + str(edited), 'x = 2\n'),
+            Document('file://' + str(tmpdir.join('new.py')), 'x = 3\n')]
+
+    assert shadow.dirty_documents(docs) == [(str(edited), 'x = 2\n')]
+    assert shadow.dirty_documents(docs, [str(edited)]) == []
+
+
+def test_shadow_file_per_text():
+    with shadow.shadowed([('/project/module.py', 'x = 1\n')]) as first, \
+            shadow.shadowed([('/project/module.py', 'x = 2\n')]) as second:
+        assert first != second
+        with open(first[0]) as f:
+            assert f.read() == 'x = 1\n'
+        with shadow.shadowed([('/project/module.py', 'x = 1\n')]) as again:
+            assert again == first
+        assert os.path.exists(first[0])
+    assert not os.path.exists(first[0])
+    assert not os.path.exists(second[0])
+
+
+@pytest.mark.parametrize('position', [
+    {'line': 0, 'character': 0}, {'line': 0, 'character': 3},
+    {'line': 1, 'character': 6}, {'line': 1, 'character': 40},
+    {'line': 5, 'character': 0}])
+def test_line_index_matches_document(position):
+    doc = Document(DOC_URI, 'an_identifier = 1\nprint(an_identifier)\n')
+    index = lines.LineIndex(doc.source)
+    assert index.word_at_position(position) == doc.word_at_position(position)
+
+
+def test_errors_to_diagnostics_splits_once(monkeypatch):
+    doc = Document(DOC_URI, 'my_var = 1\n' * 100)
+    errors = [report.parse_error_line(TEST_LINE.replace('279:8', '%d:1' % n))
+              for n in range(1, 101)]
+
+    def split_again(*args):
+        raise AssertionError('the document should only be split once')
+
+    monkeypatch.setattr(Document, 'word_at_position', split_again)
+    diags = plugin.errors_to_diagnostics(errors, doc)
+    assert len(diags) == 100
+    assert diags[42]['range']['end'] == {'line': 42, 'character': 6}
+
+
+def test_errors_of_same_named_file_are_not_for_document(tmpdir):
+    doc = Document('file://' + str(tmpdir.join('pkg', 'util.py')), 'x = 1\n')
+    errors = [report.MypyError('util.py', 1, 1, None, None, 'error', 'top',
+                               None),
+              report.MypyError('pkg/util.py', 1, 1, None, None, 'error',
+                               'pkg', None)]
+    diags = plugin.errors_to_diagnostics(errors, doc, str(tmpdir))
+    assert [diag['message'] for diag in diags] == ['pkg']
+
+
+def test_import_does_not_load_mypy():
+    code = ('import sys, pyls_mypy.plugin; '
+            'print(any(m.split(".")[0] == "mypy" for m in sys.modules))')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b'False'
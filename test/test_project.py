@@ -0,0 +1,134 @@
+import os
+from concurrent import futures
+from concurrent.futures import process
+
+from pyls import uris
+from pyls_mypy import crossfile, plugin, project
+
+
+def _write(root, files):
+    for name, source in files.items():
+        root.join(name).write(source, ensure=True)
+
+
+def test_module_name(tmpdir):
+    _write(tmpdir, {'src/pkg/__init__.py': '', 'src/pkg/mod.py': '',
+                    'script.py': ''})
+    assert project.module_name(str(tmpdir.join('src/pkg/mod.py'))) == \
+        'pkg.mod'
+    assert project.module_name(str(tmpdir.join('src/pkg/__init__.py'))) == \
+        'pkg'
+    assert project.module_name(str(tmpdir.join('script.py'))) == 'script'
+
+
+def test_find_modules_skips_tools_and_virtualenvs(tmpdir):
+    _write(tmpdir, {'a.py': '', '.tox/b.py': '', 'venv/pyvenv.cfg': '',
+                    'venv/c.py': '', 'stubs/d.pyi': ''})
+    assert sorted(project.find_modules(str(tmpdir))) == ['a', 'd']
+
+
+def test_components_follow_imports(tmpdir):
+    _write(tmpdir, {
+        'pkg/__init__.py': '',
+        'pkg/a.py': 'from . import b\n',
+        'pkg/b.py': 'import os\n',
+        'c.py': 'from pkg.a import thing\n',
+        'd.py': 'import e\n',
+        'e.py': '',
+        'f.py': 'def broken(:\n',
+    })
+    groups = project.components(
+        project.import_graph(project.find_modules(str(tmpdir))))
+    names = sorted(sorted(os.path.relpath(path, str(tmpdir))
+                          for path in group) for group in groups)
+    assert names == [
+        ['c.py', os.path.join('pkg', '__init__.py'),
+         os.path.join('pkg', 'a.py'), os.path.join('pkg', 'b.py')],
+        ['d.py', 'e.py'],
+        ['f.py'],
+    ]
+
+
+def test_dependency_stamps_keep_one_parse_per_file(tmpdir):
+    helper = tmpdir.join('helper.py')
+    _write(tmpdir, {'helper.py': 'import other\n', 'other.py': ''})
+    source = 'import helper\n'
+    stamps = project.dependency_stamps(None, source, [str(tmpdir)])
+    assert [stamp[0] for stamp in stamps] == [str(helper),
+                                              str(tmpdir.join('other.py'))]
+    for i in range(3):
+        helper.write('import other\n' + '\n' * i)
+        os.utime(str(helper), ns=(i, i))
+        assert project.dependency_stamps(None, source, [str(tmpdir)]) != \
+            stamps
+    # Only the last parse of each file is kept
+    assert len([key for key in project._imports if str(helper) in key]) == 1
+
+
+def test_shard_balances_groups():
+    groups = [['a', 'b', 'c'], ['d'], ['e', 'f'], ['g']]
+    shards = project.shard(groups, 2)
+    assert sorted(map(len, shards)) == [3, 4]
+    assert project.shard(groups, 8) == [['a', 'b', 'c'], ['e', 'f'], ['d'],
+                                        ['g']]
+
+
+def test_check_workspace(tmpdir, fake_config, fake_workspace):
+    _write(tmpdir, {'a.py': 'import b\nb.f(1)\n',
+                    'b.py': 'def f(x: str) -> None: ...\n',
+                    'c.py': 'x: int = ""\n'})
+    workspace = fake_workspace(str(tmpdir))
+    crossfile.reset()
+    try:
+        plugin._check_workspace(fake_config({'jobs': 2}), workspace,
+                                {'jobs': 2})
+    finally:
+        crossfile.reset()
+
+    def published(name):
+        return workspace.published.get(
+            uris.from_fs_path(str(tmpdir.join(name))))
+
+    assert len(published('a.py')) == 1
+    assert len(published('c.py')) == 1
+    assert published('b.py') is None
+    assert workspace.messages == ['mypy found 2 errors in 3 files']
+
+
+def test_plan_separates_duplicate_module_names(tmpdir, fake_config,
+                                               fake_workspace):
+    _write(tmpdir, {'one/conftest.py': 'import c\n',
+                    'two/conftest.py': 'import c\n',
+                    'c.py': 'x: int = ""\n'})
+    shards = project.plan(str(tmpdir), 1)
+    assert len(shards) == 2
+    for paths in shards:
+        names = [project.module_name(path) for path in paths]
+        assert len(names) == len(set(names))
+
+    workspace = fake_workspace(str(tmpdir))
+    crossfile.reset()
+    try:
+        plugin._check_workspace(fake_config({'jobs': 1}), workspace,
+                                {'jobs': 1})
+    finally:
+        crossfile.reset()
+    diagnostics = workspace.published[uris.from_fs_path(str(tmpdir.join(
+        'c.py')))]
+    assert len(diagnostics) == 1
+    assert 'Duplicate module' not in diagnostics[0]['message']
+
+
+def test_check_workspace_reports_broken_pool(tmpdir, monkeypatch,
+                                             fake_config, fake_workspace):
+    _write(tmpdir, {'a.py': 'x: int = ""\n', 'b.py': 'y: int = ""\n'})
+
+    def submit(*args, **kwargs):
+        raise process.BrokenProcessPool('a worker failed to start')
+
+    monkeypatch.setattr(futures.ProcessPoolExecutor, 'submit', submit)
+    workspace = fake_workspace(str(tmpdir))
+    plugin._check_workspace(fake_config({'jobs': 2}), workspace, {'jobs': 2})
+    assert workspace.published == {}
+    assert workspace.messages == [
+        'mypy found 0 errors in 2 files (2 files could not be checked)']
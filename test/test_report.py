@@ -0,0 +1,54 @@
+import pytest
+
+from pyls.workspace import Document
+from pyls_mypy import plugin, report
+
+DOC_URI = __file__
+DOC_TYPE_ERR = """{}.append(3)
+"""
+TYPE_ERR_MSG = '"Dict[<nothing>, <nothing>]" has no attribute "append"'
+
+
+@pytest.mark.parametrize('line,expected', [
+    ('C:\\project\\module.py:3:5: error: Name "x": undefined  [name-defined]',
+     report.MypyError('C:\\project\\module.py', 3, 5, None, None, 'error',
+                      'Name "x": undefined', 'name-defined')),
+    ('module.py:3:5:3:9: note: Revealed type is "builtins.int"',
+     report.MypyError('module.py', 3, 5, 3, 9, 'note',
+                      'Revealed type is "builtins.int"', None)),
+    ('module.py: error: Cannot find implementation or library stub',
+     report.MypyError('module.py', None, None, None, None, 'error',
+                      'Cannot find implementation or library stub', None)),
+])
+def test_parse_error_line(line, expected):
+    assert report.parse_error_line(line) == expected
+
+
+def test_parse_report_skips_summary():
+    text = ('module.py:1:1: error: Oops  [misc]\n'
+            'Found 1 error in 1 file (checked 1 source file)\n')
+    assert len(report.parse_report(text)) == 1
+
+
+def test_run_returns_error_objects():
+    errors, _, status = report.run(['--command', DOC_TYPE_ERR])
+    assert status == 1
+    assert errors == [report.MypyError('<string>', 1, 1, None, None, 'error',
+                                       TYPE_ERR_MSG, 'attr-defined')]
+
+
+def test_run_syntax_error():
+    errors, _, status = report.run(['--command', 'def ('])
+    assert status == 1
+    assert errors[0].line == 1
+    assert errors[0].severity == 'error'
+
+
+def test_diagnostic_uses_code_and_end():
+    doc = Document(DOC_URI, DOC_TYPE_ERR)
+    error = report.MypyError('test_report.py', 1, 1, 1, 3, 'error', 'msg',
+                             'misc')
+    diag = plugin.error_to_diagnostic(error, doc)
+    assert diag['code'] == 'misc'
+    assert diag['range']['start'] == {'line': 0, 'character': 0}
+    assert diag['range']['end'] == {'line': 0, 'character': 3}
@@ -0,0 +1,123 @@
+import os
+import shutil
+
+from pyls_mypy import plugin, report, sharedcache
+
+
+def _worktree(path):
+    path.join('pkg', '__init__.py').write('', ensure=True)
+    path.join('pkg', 'util.py').write('def double(x: int) -> int:\n'
+                                      '    return 2 * x\n')
+    path.join('main.py').write('from pkg.util import double\n'
+                               'y: str = double(1)\n')
+    return path
+
+
+def _check(worktree, store_dir, target='main.py'):
+    cwd = os.getcwd()
+    os.chdir(str(worktree))
+    try:
+        flags = plugin._api_flags({})
+        store = sharedcache.SharedCache(
+            str(store_dir), sharedcache.namespace(flags, str(worktree)),
+            str(worktree.join('.mypy_cache')), str(worktree), str(worktree))
+        restored = store.restore()
+        return store, restored, report.run(flags + [target])[0]
+    finally:
+        os.chdir(cwd)
+
+
+def _cached(store, name):
+    return os.path.exists(os.path.join(store.cache_dir, name + '.meta.json'))
+
+
+def test_shared_between_worktrees(tmpdir):
+    store_dir = tmpdir.join('store')
+    first = _worktree(tmpdir.join('first'))
+    store, restored, errors = _check(first, store_dir)
+    assert restored == 0
+    # mypy does not cache main, which has an error
+    assert [error.line for error in errors] == [2]
+    assert store.export() > 0
+    assert store.export() == 0
+
+    second = _worktree(tmpdir.join('second'))
+    second.join('main.py').write('from pkg.util import double\n'
+                                 'y: int = double(1)\n')
+    store, restored, errors = _check(second, store_dir)
+    assert restored > 0
+    assert _cached(store, 'pkg/util') and _cached(store, 'pkg/__init__')
+    assert errors == []
+
+
+def test_changed_source_not_restored(tmpdir):
+    store_dir = tmpdir.join('store')
+    first = _worktree(tmpdir.join('first'))
+    store = _check(first, store_dir)[0]
+    store.export()
+
+    second = tmpdir.join('second')
+    shutil.copytree(str(first), str(second),
+                    ignore=shutil.ignore_patterns('.mypy_cache'))
+    second.join('pkg', 'util.py').write('def double(x: int) -> str:\n'
+                                        '    return str(2 * x)\n')
+    store = sharedcache.SharedCache(
+        str(store_dir), store.directory.split(os.sep)[-1],
+        str(second.join('.mypy_cache')), str(second), str(second))
+    store.restore()
+    assert _cached(store, 'pkg/__init__') and not _cached(store, 'pkg/util')
+    # The string is an error against the old pkg.util only
+    assert _check(second, store_dir)[2] == []
+
+
+def test_namespace_depends_on_config(tmpdir):
+    flags = plugin._api_flags({})
+    before = sharedcache.namespace(flags, str(tmpdir))
+    tmpdir.join('mypy.ini').write('[mypy]\nstrict_optional = False\n')
+    assert sharedcache.namespace(flags, str(tmpdir)) != before
+    assert sharedcache.namespace(flags + ['--strict'], str(tmpdir)) != \
+        sharedcache.namespace(flags, str(tmpdir))
+
+
+def test_entries_restored_with_their_dependencies(tmpdir):
+    store_dir = tmpdir.join('store')
+    first = tmpdir.join('first')
+    first.join('a.py').write('from b import f\n'
+                             'x: int = f()\n', ensure=True)
+    first.join('b.py').write('def f() -> int:\n'
+                             '    return 1\n')
+    store, _, errors = _check(first, store_dir, 'a.py')
+    assert errors == []
+    store.export()
+
+    other = tmpdir.join('other')
+    other.join('b.py').write('def f() -> str:\n'
+                             '    return ""\n', ensure=True)
+    store, _, errors = _check(other, store_dir, 'b.py')
+    assert errors == []
+    store.export()
+
+    # The a of the first worktree with the b of the other
+    mixed = tmpdir.join('mixed')
+    shutil.copytree(str(first), str(mixed),
+                    ignore=shutil.ignore_patterns('.mypy_cache'))
+    shutil.copy(str(other.join('b.py')), str(mixed.join('b.py')))
+    store, _, errors = _check(mixed, store_dir, 'a.py')
+    assert _cached(store, 'b')
+    assert [(error.path, error.line) for error in errors] == [('a.py', 2)]
+
+
+def test_cache_of_configured_python_version(tmpdir):
+    store_dir = tmpdir.join('store')
+    first = _worktree(tmpdir.join('first'))
+    first.join('mypy.ini').write('[mypy]\npython_version = 3.8\n')
+    with first.as_cwd():
+        flags = plugin._api_flags({})
+        assert sharedcache.cache_version(flags) == '3.8'
+        store = sharedcache.get_store(
+            str(store_dir), sharedcache.namespace(flags, str(first)),
+            str(first.join('.mypy_cache')), str(first), str(first), flags)
+        report.run(flags + ['main.py'])
+    assert store.cache_dir.endswith('3.8')
+    assert _cached(store, 'pkg/util')
+    assert store.export() > 0
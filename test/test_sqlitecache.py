@@ -0,0 +1,50 @@
+import os
+import sqlite3
+
+from pyls.workspace import Document
+from pyls_mypy import plugin, sqlitecache
+
+
+def _fragmented_db(cache_dir):
+    path = cache_dir.join('3.8', sqlitecache.DB_NAME)
+    path.dirpath().ensure(dir=True)
+    conn = sqlite3.connect(str(path))
+    conn.execute('CREATE TABLE files (path TEXT, data BLOB)')
+    conn.executemany('INSERT INTO files VALUES (?, ?)',
+                     [(str(i), b'x' * 4096) for i in range(200)])
+    conn.commit()
+    conn.execute('DELETE FROM files WHERE rowid > 50')
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_vacuum_reclaims_space(tmpdir):
+    path = _fragmented_db(tmpdir)
+    assert sqlitecache.databases(str(tmpdir)) == [str(path)]
+    size = os.path.getsize(str(path))
+
+    reclaimed = sqlitecache.vacuum(str(tmpdir))
+    assert reclaimed > 0
+    assert os.path.getsize(str(path)) == size - reclaimed
+    # Nothing left to reclaim
+    assert sqlitecache.vacuum(str(tmpdir)) == 0
+
+
+def test_vacuum_skips_cache_in_use(tmpdir):
+    _fragmented_db(tmpdir)
+    with sqlitecache.locked(str(tmpdir)) as held:
+        assert held
+        assert sqlitecache.vacuum(str(tmpdir)) == 0
+    assert sqlitecache.vacuum(str(tmpdir)) > 0
+
+
+def test_plugin_uses_sqlite_cache(tmpdir, fake_config):
+    module = tmpdir.join('module.py')
+    module.write('')
+    doc = Document('file://' + str(module), 'x: int = ""\n')
+    config = fake_config({'sqlite_cache': True, 'cache_size': 0})
+    with tmpdir.as_cwd():
+        diags = plugin.pyls_lint(config, None, doc, is_saved=False)
+    assert len(diags) == 1
+    assert sqlitecache.databases(str(tmpdir.join('.mypy_cache')))
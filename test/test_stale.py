@@ -0,0 +1,65 @@
+import os
+
+from pyls.workspace import Document
+from pyls_mypy import cache, plugin, report, stale, stats
+
+DOC_URI = __file__
+
+
+def _diag(line):
+    return {'range': {'start': {'line': line, 'character': 0},
+                      'end': {'line': line, 'character': 1}}}
+
+
+def test_is_stale():
+    doc = Document(DOC_URI, 'x = 1\n', version=1)
+    snapshot = Document(DOC_URI, 'x = 1\n', version=1)
+    assert not stale.is_stale(snapshot, doc)
+
+    doc.version = 2
+    assert not stale.is_stale(snapshot, doc)
+
+    doc = Document(DOC_URI, 'x = 2\n', version=2)
+    assert stale.is_stale(snapshot, doc)
+
+
+def test_remap_moves_and_drops():
+    old = 'a = 1\nb = 2\nc = 3\n'
+    new = '# comment\na = 1\nb = 20\nc = 3\n'
+    remapped = stale.remap([_diag(0), _diag(1), _diag(2)], old, new)
+    assert [d['range']['start']['line'] for d in remapped] == [1, 3]
+    assert [d['range']['end']['line'] for d in remapped] == [1, 3]
+
+
+def _edit_during_check(monkeypatch, doc):
+    cache.diagnostics_cache.clear()
+
+    def run(args, timings):
+        doc.apply_change({'text': '\n' + doc.source})
+        doc.version = 2
+        # mypy reports paths relative to where it runs
+        path = os.path.relpath(__file__)
+        return report.parse_report('%s:1:1: error: first\n'
+                                   '%s:2:1: error: second\n' % (path, path)), \
+            '', 1
+
+    monkeypatch.setattr(plugin.report, 'run', run)
+
+
+def test_sync_result_is_remapped(monkeypatch, fake_config):
+    doc = Document(DOC_URI, 'x = 1\ny = 2\n', version=1)
+    _edit_during_check(monkeypatch, doc)
+
+    diags = plugin.pyls_lint(fake_config(), None, doc, is_saved=False)
+    assert [d['range']['start']['line'] for d in diags] == [1, 2]
+
+
+def test_background_result_is_dropped(monkeypatch):
+    doc = Document(DOC_URI, 'x = 1\ny = 2\n', version=1)
+    snapshot = Document(DOC_URI, doc.source, version=1)
+    _edit_during_check(monkeypatch, doc)
+
+    _, _, run, _ = plugin._prepare_check({}, None, snapshot, False)
+    assert plugin._lint(snapshot, doc, 'key', run, cache.diagnostics_cache,
+                        stats.Timings(), drop_stale=True) is None
+    assert len(cache.diagnostics_cache) == 0
@@ -0,0 +1,46 @@
+from pyls.workspace import Document
+from pyls_mypy import cache, plugin, stats
+
+DOC_URI = __file__
+DOC_TYPE_ERR = """{}.append(3)
+"""
+
+
+def test_timings_add_up():
+    timings = stats.Timings()
+    with timings.stage('mypy'):
+        pass
+    with timings.stage('mypy'):
+        pass
+    with timings.stage('ranges'):
+        pass
+    assert list(timings.stages) == ['mypy', 'ranges']
+    assert timings.total == sum(timings.stages.values())
+
+
+def test_registry_aggregates():
+    registry = stats.Registry()
+    for seconds in (1.0, 3.0):
+        timings = stats.Timings()
+        timings.stages['mypy'] = seconds
+        registry.record(timings)
+    registry.incr('cache_hits')
+
+    snapshot = registry.snapshot()
+    assert snapshot['counters'] == {'cache_hits': 1}
+    assert snapshot['stages']['mypy'] == {
+        'count': 2, 'total': 4.0, 'max': 3.0, 'last': 3.0}
+
+
+def test_plugin_records_stages(fake_config):
+    cache.diagnostics_cache.clear()
+    stats.registry.reset()
+    doc = Document(DOC_URI, DOC_TYPE_ERR)
+    plugin.pyls_lint(fake_config(), None, doc, is_saved=False)
+    plugin.pyls_lint(fake_config(), None, doc, is_saved=False)
+
+    snapshot = stats.registry.snapshot()
+    assert snapshot['counters'] == {'cache_hits': 1, 'cache_misses': 1}
+    assert snapshot['stages']['settings']['count'] == 2
+    for stage in ('mypy', 'parse', 'ranges'):
+        assert snapshot['stages'][stage]['count'] == 1
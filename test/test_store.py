@@ -0,0 +1,62 @@
+from pyls.workspace import Document
+from pyls_mypy import cache, plugin, store
+
+DIAGNOSTICS = [{'source': 'mypy', 'message': 'no',
+                'range': {'start': {'line': 0, 'character': 0},
+                          'end': {'line': 0, 'character': 1}}}]
+
+
+def test_put_and_take(tmpdir):
+    path = str(tmpdir.join('diagnostics.db'))
+    diagnostics_store = store.DiagnosticsStore(path)
+    diagnostics_store.put('/a.py', 'key', DIAGNOSTICS)
+    diagnostics_store.close()
+
+    # As after a restart
+    diagnostics_store = store.DiagnosticsStore(path)
+    assert diagnostics_store.take('/a.py', 'other') is None
+    assert diagnostics_store.take('/a.py', 'key') == DIAGNOSTICS
+    # Served once, then checks take over
+    assert diagnostics_store.take('/a.py', 'key') is None
+    assert diagnostics_store.take('/b.py', 'key') is None
+
+
+def test_prune(tmpdir, monkeypatch):
+    monkeypatch.setattr(store, 'PRUNE_EVERY', 5)
+    diagnostics_store = store.DiagnosticsStore(
+        str(tmpdir.join('diagnostics.db')), max_entries=3)
+    for i in range(5):
+        diagnostics_store.put('/%d.py' % i, 'key', [])
+    assert [diagnostics_store.take('/%d.py' % i, 'key') for i in range(5)] \
+        == [None, None, [], [], []]
+
+
+def test_served_after_restart(tmpdir, monkeypatch, fake_config,
+                              fake_workspace):
+    module = tmpdir.join('module.py')
+    module.write('1 + ""\n')
+    doc = Document('file://' + str(module), module.read())
+    config = fake_config({'persist_diagnostics': True,
+                          'diagnostics_store': str(tmpdir.join('store.db')),
+                          'cross_file': False})
+    workspace = fake_workspace(str(tmpdir))
+    cache.diagnostics_cache.clear()
+    with tmpdir.as_cwd():
+        diags = plugin.pyls_lint(config, workspace, doc, True)
+        assert len(diags) == 1
+
+        # A new session has neither the memory cache nor the store state
+        cache.diagnostics_cache.clear()
+        store._stores.clear()
+        revalidations = []
+        plugin_revalidate = plugin._revalidate
+
+        def revalidate(*args):
+            revalidations.append(plugin_revalidate(*args))
+
+        monkeypatch.setattr(plugin, '_revalidate', revalidate)
+        assert plugin.pyls_lint(config, workspace, doc, True) == diags
+        revalidations[0].join()
+
+    # The check confirmed the stored diagnostics
+    assert len(cache.diagnostics_cache) == 1
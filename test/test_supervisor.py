@@ -0,0 +1,74 @@
+import time
+
+from pyls_mypy import engine, supervisor
+
+
+def test_rss_bytes():
+    assert supervisor.rss_bytes() > 0
+
+
+def test_recycle_after_max_checks():
+    watchdog = supervisor.Supervisor('test')
+    watchdog.configure(max_checks=2, max_rss_mb=0)
+    assert not watchdog.checked()
+    assert watchdog.checked()
+
+
+def test_recycle_on_rss():
+    watchdog = supervisor.Supervisor('test')
+    watchdog.configure(max_checks=0, max_rss_mb=1)
+    assert watchdog.checked(pid=supervisor.os.getpid())
+    assert watchdog.status()['rss'] > 1024 * 1024
+
+
+def test_rss_limit_counts_growth_since_rewarm():
+    watchdog = supervisor.Supervisor('test')
+    watchdog.configure(max_checks=0, max_rss_mb=1)
+    pid = supervisor.os.getpid()
+    assert not watchdog.checked(pid=pid, rewarm=True)
+    assert watchdog.status()['baseline'] > 1024 * 1024
+    # The process does not shrink, but did not grow by 1 MiB either
+    assert not watchdog.checked(pid=pid)
+    data = b'x' * (4 * 1024 * 1024)
+    assert watchdog.checked(pid=pid)
+    del data
+
+
+def test_engine_rewarm_does_not_recycle(tmpdir):
+    module = tmpdir.join('module.py')
+    module.write('x = 1\n')
+    fine_grained = engine.Engine(str(tmpdir), [])
+    fine_grained.supervisor.configure(max_checks=0, max_rss_mb=1)
+    fine_grained.check([str(module)])
+    recycles = supervisor.stats.registry.snapshot()['counters'].get(
+        'recycles', 0)
+
+    deadline = time.time() + 30
+    while fine_grained.supervisor.baseline is None and \
+            time.time() < deadline:
+        time.sleep(0.1)
+    time.sleep(1)
+    with fine_grained._lock:
+        assert fine_grained.supervisor.checks == 1
+        assert fine_grained.supervisor.baseline is not None
+    assert supervisor.stats.registry.snapshot()['counters'].get(
+        'recycles', 0) == recycles
+
+
+def test_engine_is_recycled_and_rewarmed(tmpdir):
+    module = tmpdir.join('module.py')
+    module.write('x = 1\n')
+    fine_grained = engine.Engine(str(tmpdir), [])
+    fine_grained.supervisor.configure(max_checks=2, max_rss_mb=0)
+
+    fine_grained.check([str(module)])
+    first_server = fine_grained._server
+    fine_grained.check([str(module)])
+
+    deadline = time.time() + 30
+    while fine_grained.supervisor.checks != 1 and time.time() < deadline:
+        time.sleep(0.1)
+    with fine_grained._lock:
+        assert fine_grained.supervisor.checks == 1
+        assert fine_grained._server is not first_server
+        assert fine_grained._files == [str(module)]
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from pyls_mypy import plugin, sqlitecache, warmup
+
+
+def _wait_for(warm):
+    deadline = time.time() + 60
+    while warm.running and time.time() < deadline:
+        time.sleep(0.1)
+    assert not warm.running
+
+
+def _state(pid):
+    with open('/proc/%d/stat' % pid) as f:
+        return f.read().rsplit(')', 1)[1].split()[0]
+
+
+def _wait_for_state(pid, stopped):
+    # Signals are delivered asynchronously
+    deadline = time.time() + 5
+    while (_state(pid) == 'T') != stopped and time.time() < deadline:
+        time.sleep(0.01)
+    return _state(pid)
+
+
+@pytest.fixture
+def project(tmpdir):
+    tmpdir.join('module.py').write('x = 1\n')
+    return tmpdir
+
+
+def test_warmup_fills_cache(project):
+    warm = warmup.Warmup(['--incremental'], [str(project)], str(project))
+    _wait_for(warm.start())
+    assert project.join('.mypy_cache').check(dir=True)
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc')
+def test_warmup_yields_to_foreground(project):
+    warm = warmup.Warmup(['--incremental'], [str(project)], str(project))
+    try:
+        with warmup.foreground():
+            warm.start()
+            assert _wait_for_state(warm._proc.pid, True) == 'T'
+        assert _wait_for_state(warm._proc.pid, False) != 'T'
+    finally:
+        warm.cancel()
+    _wait_for(warm)
+
+
+def test_warmup_cancel(project):
+    warm = warmup.Warmup(['--incremental'], [str(project)], str(project))
+    with warmup.foreground():
+        warm.start()
+        warm.cancel()
+    _wait_for(warm)
+    assert not project.join('.mypy_cache').check()
+
+
+def test_plugin_starts_warmup(project, fake_config, fake_workspace):
+    with project.as_cwd():
+        plugin.pyls_initialize(fake_config({'warmup': True}),
+                               fake_workspace(str(project)))
+        assert len(warmup._running) == 1
+        _wait_for(next(iter(warmup._running)))
+    assert project.join('.mypy_cache').check(dir=True)
+
+
+def test_sqlite_warmup_is_stopped_by_checks(project, fake_config,
+                                            fake_workspace):
+    with project.as_cwd():
+        plugin.pyls_initialize(
+            fake_config({'warmup': True, 'sqlite_cache': True}),
+            fake_workspace(str(project)))
+        warm = next(iter(warmup._running))
+        with warmup.foreground():
+            # A suspended warm-up would keep the cache locked for writing
+            with sqlitecache.locked(str(project.join('.mypy_cache'))):
+                assert not warm.running
+        _wait_for(warm)
+    with sqlitecache.locked(str(project.join('.mypy_cache')),
+                            blocking=False) as held:
+        assert held
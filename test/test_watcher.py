@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from pyls_mypy import engine, plugin, stats, watcher
+
+
+def test_recheck_lists():
+    changes = {'/a.py', '/b.py', '/c.py'}, {'/d.py', '/e.py'}
+    sources = ['/a.py', '/b.py', '/d.py']
+    assert watcher.recheck_lists(changes, ['/a.py'], sources) == \
+        (['/a.py', '/b.py'], ['/d.py'])
+    assert watcher.recheck_lists((set(), set()), ['/a.py'], sources) == \
+        (['/a.py'], [])
+    assert watcher.recheck_lists(None, ['/a.py'], sources) is None
+
+
+@pytest.mark.parametrize('flags,follows', [
+    ([], True), (['--follow-imports', 'normal'], True),
+    (['--follow-imports', 'silent'], True),
+    (['--follow-imports', 'skip'], False),
+    (['--strict', '--follow-imports', 'error'], False)])
+def test_follows_imports(flags, follows):
+    assert watcher.follows_imports(flags) == follows
+
+
+def test_polling_watcher(tmpdir, monkeypatch):
+    monkeypatch.setattr(watcher, 'observers', None)
+    kept = tmpdir.join('kept.py')
+    kept.write('x = 1\n')
+    gone = tmpdir.join('gone.py')
+    gone.write('')
+    tmpdir.join('notes.txt').write('')
+    files_watcher = watcher.Watcher(str(tmpdir), poll_interval=0.05).start()
+    try:
+        time.sleep(0.3)
+        assert files_watcher.changes() == (set(), set())
+        kept.write('x = 12\n')
+        gone.remove()
+        tmpdir.join('notes.txt').write('changed')
+        time.sleep(0.3)
+        changes = files_watcher.changes()
+    finally:
+        files_watcher.stop()
+
+    assert changes == ({str(kept)}, {str(gone)})
+
+
+class FakeWatcher(object):
+    def __init__(self):
+        self.changed = set()
+
+    def changes(self):
+        changes, self.changed = (self.changed, set()), set()
+        return changes
+
+
+def test_engine_rechecks_changed_files(tmpdir):
+    module = tmpdir.join('module.py')
+    module.write('x = 1\n')
+    other = tmpdir.join('other.py')
+    other.write('y = 1\n')
+    fine_grained = engine.Engine(str(tmpdir), ['--follow-imports', 'skip'])
+    fine_grained.watcher = FakeWatcher()
+    fine_grained.check([str(module)])
+    fine_grained.check([str(other)])
+
+    stats.registry.reset()
+    module.write('x = 1 + ""\n')
+    fine_grained.watcher.changed.add(str(module))
+    report, _, status = fine_grained.check([str(other)])
+    assert status == 1
+    assert 'Unsupported operand types' in report
+    assert stats.registry.snapshot()['counters'] == {
+        'rescans': 1, 'files_rescanned': 2}
+
+
+@pytest.mark.parametrize('follow_imports,watched', [
+    ('normal', False), ('skip', True)])
+def test_watched_only_without_following_imports(tmpdir, follow_imports,
+                                                watched):
+    module = tmpdir.join('module.py')
+    module.write('x = 1\n')
+    settings = {'follow_imports': follow_imports}
+    flags = plugin._server_flags(settings)
+    try:
+        plugin._server_run('fine_grained', settings, str(tmpdir), flags,
+                           [str(module)])(stats.Timings())
+        server = engine.get_engine(str(tmpdir), flags)
+        assert (server.watcher is not None) == watched
+    finally:
+        watcher.stop_all()
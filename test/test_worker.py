@@ -0,0 +1,106 @@
+import threading
+import time
+
+from pyls import uris
+from pyls.workspace import Document
+from pyls_mypy import plugin, stats, worker
+
+DOC_URI = __file__
+DOC_TYPE_ERR = """{}.append(3)
+"""
+TYPE_ERR_MSG = '"Dict[<nothing>, <nothing>]" has no attribute "append"'
+
+
+def _check(key, ran, published):
+    return worker.Check('uri', key, lambda: ran.append(key) or [key],
+                        published.set)
+
+
+def test_newer_check_supersedes_pending():
+    checker = worker.BackgroundChecker()
+    ran, published = [], threading.Event()
+    first = checker.submit(_check('first', ran, published), delay=10)
+    checker.submit(_check('second', ran, published), delay=0)
+
+    assert published.wait(5)
+    assert first.cancelled
+    assert ran == ['second']
+    assert checker.result('uri', 'second') == ['second']
+    assert checker.result('uri', 'first') is None
+
+
+def test_cancelled_running_check_is_not_published():
+    checker = worker.BackgroundChecker()
+    published = threading.Event()
+    started, release = threading.Event(), threading.Event()
+
+    def run():
+        started.set()
+        release.wait(5)
+        return ['stale']
+
+    checker.submit(worker.Check('uri', 'first', run, published.set), 0)
+    assert started.wait(5)
+    checker.submit(_check('second', [], published), delay=10)
+    release.set()
+
+    assert not published.wait(0.5)
+    assert checker.last_result('uri') is None
+
+
+def test_plugin_background(fake_config, fake_workspace):
+    doc = Document(DOC_URI, DOC_TYPE_ERR)
+    workspace = fake_workspace(documents=[doc])
+    config = fake_config({'background': True, 'debounce': 0,
+                          'cache_size': 0})
+
+    assert plugin.pyls_lint(config, workspace, doc, False) == []
+    assert workspace.done.wait(30)
+
+    assert list(workspace.published) == [DOC_URI]
+    diags = workspace.published[DOC_URI]
+    assert len(diags) == 1
+    assert diags[0]['message'] == TYPE_ERR_MSG
+
+
+def test_due_checks_are_batched():
+    checker = worker.BackgroundChecker()
+    batches = []
+    published = threading.Event()
+
+    def run_batch(checks):
+        batches.append([check.uri for check in checks])
+        return [[check.part] for check in checks]
+
+    for uri in ('a', 'b'):
+        checker.submit(worker.Check(uri, uri, None, published.set,
+                                    batch_key='flags', run_batch=run_batch,
+                                    part=uri.upper()),
+                       delay=0, window=0.5)
+    assert published.wait(5)
+    assert batches == [['a', 'b']]
+    assert checker.result('b', 'b') == ['B']
+
+
+def test_plugin_batches_documents(tmpdir, fake_config, fake_workspace):
+    docs = []
+    for name in ('one.py', 'two.py'):
+        path = tmpdir.join(name)
+        path.write('')
+        docs.append(Document(uris.from_fs_path(str(path)), DOC_TYPE_ERR))
+    workspace = fake_workspace(documents=docs)
+    config = fake_config({'background': True, 'debounce': 0,
+                          'cache_size': 0, 'coalesce_window': 0.5})
+    coalesced = stats.registry.snapshot()['counters'].get('coalesced', 0)
+
+    for doc in docs:
+        assert plugin.pyls_lint(config, workspace, doc, False) == []
+    deadline = time.time() + 30
+    while len(workspace.published) < 2 and time.time() < deadline:
+        time.sleep(0.1)
+
+    assert sorted(workspace.published) == sorted(doc.uri for doc in docs)
+    for diags in workspace.published.values():
+        assert [diag['message'] for diag in diags] == [TYPE_ERR_MSG]
+    assert stats.registry.snapshot()['counters']['coalesced'] == \
+        coalesced + 1